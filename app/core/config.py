@@ -3,10 +3,11 @@ ConfiguraciÃ³n centralizada de la aplicaciÃ³n.
 Gestiona las credenciales de bases de datos y parÃ¡metros del sistema.
 """
 import re
+from functools import cached_property
 from pathlib import Path
 from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -46,6 +47,13 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "nexus_dev_84"
     POSTGRES_PASSWORD: str = "ZehK7wQTpq95eU8r"
     POSTGRES_DATABASE: str = "nexus_db"
+
+    # Pool de conexiones para MySQL y PostgreSQL (pre-ping + reciclado)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # Filas por sentencia en executemany de PostgreSQL (INSERT multi-VALUES / execute_batch)
+    DB_EXECUTEMANY_PAGE_SIZE: int = 1000
     
     # ConfiguraciÃ³n de negocio
     # Casas de Cobranza:
@@ -80,6 +88,8 @@ class Settings(BaseSettings):
     REPORT_FILE_USER_45: str = "asignacion_45.txt"
     REPORT_FILE_USER_81: str = "asignacion_81.txt"
     REPORT_EXCEL_FIXED: str = "reporte_fijos_efect.xlsx"
+    # Formato del informe de casa de cobranza: "xlsx" (por defecto) o "parquet" (requiere pyarrow)
+    REPORTS_OUTPUT_FORMAT: str = "xlsx"
     
     # Reportes para divisiÃ³n de contratos (8 usuarios)
     REPORT_FILE_DIVISION: str = "division_contratos_{user_id}.txt"
@@ -188,6 +198,13 @@ class Settings(BaseSettings):
         """Retorna todos los usuarios de ambas casas de cobranza"""
         return self.COBYSER_USERS + self.SERLEFIN_USERS
 
+    @cached_property
+    def user_house(self) -> Dict[int, str]:
+        """Mapa user_id -> casa ('cobyser' | 'serlefin') para conteos por fila (se arma una vez)"""
+        house = {int(user_id): "serlefin" for user_id in self.SERLEFIN_USERS}
+        house.update({int(user_id): "cobyser" for user_id in self.COBYSER_USERS})
+        return house
+
     @staticmethod
     def _parse_recipients(raw_value: str) -> List[str]:
         """Convierte una cadena CSV de correos en lista unica y normalizada."""
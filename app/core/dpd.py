@@ -1,8 +1,11 @@
 """
 Utilidades para clasificar dias de atraso (DPD) por rangos de negocio.
 """
+from functools import lru_cache
 from typing import Optional
 
+import numpy as np
+
 
 DPD_RANGES = (
     "4_15",
@@ -32,10 +35,24 @@ ASSIGNMENT_DPD_ORDER = (
     "0",
 )
 
+# Limite inferior de cada bucket de asignacion, de menor a mayor atraso
+# (el bucket "0" cubre todo lo que queda por debajo de 1).
+_ASSIGNMENT_DPD_ASC = tuple(reversed(ASSIGNMENT_DPD_ORDER))
+_ASSIGNMENT_DPD_LOWER_BOUNDS = np.array(
+    [1, 4, 16, 31, 46, 61, 91, 121, 151, 181, 210],
+    dtype=np.int32,
+)
+
+# Mismos limites para get_dpd_range, cuyo ultimo bucket es "210_MAS".
+_DPD_RANGE_ASC = ("0", "1_3") + DPD_RANGES
+_DPD_RANGE_NAMES = np.array(_DPD_RANGE_ASC, dtype=object)
+
 
+@lru_cache(maxsize=4096)
 def get_dpd_range(days_overdue: Optional[int]) -> Optional[str]:
     """
     Retorna el rango DPD configurado para un numero de dias de atraso.
+    Memoizada: los dias de atraso se repiten mucho entre contratos.
 
     Args:
         days_overdue: Dias de atraso exactos
@@ -102,3 +119,25 @@ def get_assignment_dpd_range(days_overdue: Optional[int]) -> Optional[str]:
     if days_overdue <= 0:
         return "0"
     return "1_3"
+
+
+def get_assignment_dpd_bucket_index(days_overdue: np.ndarray) -> np.ndarray:
+    """
+    Version vectorizada de get_assignment_dpd_range.
+    Retorna la posicion del bucket en orden ascendente (0 => "0", 11 => "210_240").
+    """
+    return np.searchsorted(_ASSIGNMENT_DPD_LOWER_BOUNDS, days_overdue, side="right")
+
+
+def get_assignment_dpd_range_by_index(bucket_index: int) -> str:
+    """Nombre del bucket para un indice de get_assignment_dpd_bucket_index."""
+    return _ASSIGNMENT_DPD_ASC[int(bucket_index)]
+
+
+def get_dpd_range_vec(days_overdue: np.ndarray) -> np.ndarray:
+    """
+    Version vectorizada de get_dpd_range para arreglos de enteros.
+    Retorna un arreglo object con el nombre del rango por posicion.
+    """
+    bucket_index = np.searchsorted(_ASSIGNMENT_DPD_LOWER_BOUNDS, days_overdue, side="right")
+    return _DPD_RANGE_NAMES[bucket_index]
@@ -11,6 +11,10 @@ __all__ = [
     "Management",
     "ContractAdvisorHistory",
     "Base",
+    "insert_on_conflict_returning",
+    "copy_insert",
+    "copy_insert_on_conflict_returning",
+    "delete_returning",
 ]
 
 
@@ -21,4 +25,12 @@ def __getattr__(name: str):
     if name in {"ContractAdvisor", "Management", "ContractAdvisorHistory", "Base"}:
         module = import_module("app.database.models")
         return getattr(module, name)
+    if name in {
+        "insert_on_conflict_returning",
+        "copy_insert",
+        "copy_insert_on_conflict_returning",
+        "delete_returning",
+    }:
+        module = import_module("app.database.bulk")
+        return getattr(module, name)
     raise AttributeError(f"module 'app.database' has no attribute '{name}'")
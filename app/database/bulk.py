@@ -0,0 +1,204 @@
+"""
+Utilidades de insercion masiva para PostgreSQL.
+Agrupa filas en lotes de tamano fijo (potencias de 2) para que cada forma
+de INSERT multi-fila se compile una sola vez y se reutilice entre lotes.
+Para cargas grandes, copy_insert y copy_insert_on_conflict_returning usan
+COPY FROM STDIN. delete_returning borra por clave y devuelve columnas en una
+sola sentencia.
+"""
+import io
+from typing import Any, Collection, Dict, List, Optional, Sequence
+
+from sqlalchemy import column, delete, inspect, select, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+POWER_OF_TWO_BATCH_SIZES = (512, 128, 32, 8, 2, 1)
+
+# A partir de este volumen conviene COPY; por debajo, el costo de la tabla
+# temporal y los viajes extra supera al del INSERT multi-fila.
+COPY_INSERT_THRESHOLD = 5000
+
+# Tabla temporal de paso para COPY (se elimina al confirmar la transaccion).
+_COPY_STAGE_TABLE = "_copy_stage"
+
+
+def split_power_of_two(
+    total: int,
+    sizes: Sequence[int] = POWER_OF_TWO_BATCH_SIZES,
+) -> List[int]:
+    """
+    Descompone total en lotes usando solo los tamanos dados (de mayor a menor).
+
+    Ejemplo: 1100 => [512, 512, 32, 32, 8, 2, 2]
+    """
+    batches: List[int] = []
+    remaining = max(0, int(total))
+    for size in sizes:
+        count, remaining = divmod(remaining, size)
+        batches.extend([size] * count)
+    return batches
+
+
+def insert_on_conflict_returning(
+    session: Session,
+    model: Any,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[Any],
+    returning: Sequence[Any],
+    sizes: Sequence[int] = POWER_OF_TWO_BATCH_SIZES,
+    conflict_where: Optional[Any] = None,
+) -> List[Any]:
+    """
+    INSERT multi-fila con ON CONFLICT DO NOTHING RETURNING, en lotes fijos.
+
+    No hace commit: la transaccion queda a cargo del llamador.
+    conflict_where indica el predicado de un indice unico parcial.
+
+    Returns:
+        Filas devueltas por RETURNING (solo las realmente insertadas)
+    """
+    returned: List[Any] = []
+    offset = 0
+    for size in split_power_of_two(len(rows), sizes):
+        statement = (
+            pg_insert(model)
+            .values(rows[offset:offset + size])
+            .on_conflict_do_nothing(
+                index_elements=list(conflict_columns),
+                index_where=conflict_where,
+            )
+            .returning(*returning)
+        )
+        returned.extend(session.execute(statement).all())
+        offset += size
+    return returned
+
+
+def delete_returning(
+    session: Session,
+    model: Any,
+    key_column: Any,
+    keys: Collection[Any],
+    returning: Sequence[Any],
+) -> List[Any]:
+    """
+    DELETE ... WHERE key_column IN (keys) RETURNING en una sola sentencia.
+
+    No hace commit: la transaccion queda a cargo del llamador.
+
+    Returns:
+        Filas devueltas por RETURNING (solo las realmente borradas)
+    """
+    if not keys:
+        return []
+    return session.execute(
+        delete(model).where(key_column.in_(keys)).returning(*returning)
+    ).all()
+
+
+def _copy_text_value(value: Any) -> str:
+    """Valor en formato texto de COPY: NULL como \\N y escapes de tab/salto de linea."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_rows(
+    session: Session,
+    table_sql: str,
+    column_sql: str,
+    keys: Sequence[str],
+    rows: List[Dict[str, Any]],
+) -> None:
+    """Envia rows con COPY ... FROM STDIN (formato texto) por la conexion de la sesion."""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text_value(row[key]) for key in keys))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_sql} ({column_sql}) FROM STDIN", buffer)
+    finally:
+        cursor.close()
+
+
+def copy_insert(session: Session, model: Any, rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserta rows directo en la tabla del modelo con COPY FROM STDIN.
+
+    Sin control de conflictos: el llamador ya descarto los existentes. Las
+    claves de rows son los atributos del modelo y deben ser las mismas en
+    todas las filas. No hace commit.
+
+    Returns:
+        Cantidad de filas copiadas
+    """
+    if not rows:
+        return 0
+    preparer = session.connection().dialect.identifier_preparer
+    mapper = inspect(model)
+    keys = list(rows[0].keys())
+    column_sql = ", ".join(preparer.quote(mapper.columns[key].name) for key in keys)
+    _copy_rows(session, preparer.format_table(mapper.local_table), column_sql, keys, rows)
+    return len(rows)
+
+
+def copy_insert_on_conflict_returning(
+    session: Session,
+    model: Any,
+    rows: List[Dict[str, Any]],
+    conflict_columns: Sequence[Any],
+    returning: Sequence[Any],
+    conflict_where: Optional[Any] = None,
+) -> List[Any]:
+    """
+    Como insert_on_conflict_returning, pero carga las filas con COPY.
+
+    Las filas van por COPY FROM STDIN a una tabla temporal y pasan a la tabla
+    destino con un solo INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING.
+    Las claves de rows son los atributos del modelo (como en
+    bulk_insert_mappings) y deben ser las mismas en todas las filas.
+    No hace commit: la transaccion queda a cargo del llamador.
+
+    Returns:
+        Filas devueltas por RETURNING (solo las realmente insertadas)
+    """
+    if not rows:
+        return []
+
+    preparer = session.connection().dialect.identifier_preparer
+    mapper = inspect(model)
+    keys = list(rows[0].keys())
+    column_names = [mapper.columns[key].name for key in keys]
+    column_sql = ", ".join(preparer.quote(name) for name in column_names)
+
+    session.execute(text(f"DROP TABLE IF EXISTS {_COPY_STAGE_TABLE}"))
+    session.execute(
+        text(
+            f"CREATE TEMP TABLE {_COPY_STAGE_TABLE} ON COMMIT DROP AS "
+            f"SELECT {column_sql} FROM {preparer.format_table(mapper.local_table)} "
+            "WITH NO DATA"
+        )
+    )
+
+    _copy_rows(session, _COPY_STAGE_TABLE, column_sql, keys, rows)
+
+    stage = table(_COPY_STAGE_TABLE, *[column(name) for name in column_names])
+    statement = (
+        pg_insert(mapper.local_table)
+        .from_select(column_names, select(*stage.c))
+        .on_conflict_do_nothing(
+            index_elements=list(conflict_columns),
+            index_where=conflict_where,
+        )
+        .returning(*returning)
+    )
+    return session.execute(statement).all()
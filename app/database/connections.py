@@ -6,7 +6,7 @@ import logging
 from contextlib import contextmanager
 from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -35,13 +35,27 @@ class DatabaseManager:
         if self._postgres_engine is None:
             self._initialize_postgres()
     
+    @staticmethod
+    def _pool_options() -> dict:
+        """
+        Pool reutilizable: evita un handshake TCP/auth por cada sesion.
+        pre_ping descarta conexiones caidas y recycle evita timeouts del servidor.
+        """
+        return {
+            "poolclass": QueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_pre_ping": True,
+            "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        }
+
     def _initialize_mysql(self):
         """Configura el engine de MySQL"""
         try:
             logger.info(f"Conectando a MySQL: {settings.MYSQL_HOST}")
             self._mysql_engine = create_engine(
                 settings.mysql_url,
-                poolclass=NullPool,   # Sin pool: conexion bajo demanda, cierre inmediato
+                **self._pool_options(),
                 echo=settings.DEBUG,
             )
             self._mysql_session_factory = sessionmaker(
@@ -61,9 +75,14 @@ class DatabaseManager:
         """Configura el engine de PostgreSQL"""
         try:
             logger.info(f"Conectando a PostgreSQL: {settings.POSTGRES_HOST}")
+            # executemany de psycopg2: INSERT con VALUES multi-fila y
+            # UPDATE/DELETE con execute_batch, en paginas de DB_EXECUTEMANY_PAGE_SIZE.
             self._postgres_engine = create_engine(
                 settings.postgres_url,
-                poolclass=NullPool,   # Sin pool: conexion bajo demanda, cierre inmediato
+                **self._pool_options(),
+                executemany_mode="values_plus_batch",
+                insertmanyvalues_page_size=settings.DB_EXECUTEMANY_PAGE_SIZE,
+                executemany_batch_page_size=settings.DB_EXECUTEMANY_PAGE_SIZE,
                 echo=settings.DEBUG,
             )
             self._postgres_session_factory = sessionmaker(
@@ -2,7 +2,7 @@
 Modelos de datos SQLAlchemy para las tablas de la base de datos.
 Define la estructura de las tablas y las relaciones.
 """
-from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Text, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -64,7 +64,18 @@ class ContractAdvisorHistory(Base):
     - Fecha Terminal: Fecha en que se removió el contrato (null si aún activo)
     """
     __tablename__ = "contract_advisors_history"
-    __table_args__ = {"schema": "alocreditindicators"}
+    __table_args__ = (
+        # Indice unico parcial: un solo historial abierto por (contrato, usuario).
+        # Sirve a las busquedas de activos y al ON CONFLICT de register_assignments.
+        Index(
+            "ux_cah_active_pair",
+            "contract_id",
+            "user_id",
+            unique=True,
+            postgresql_where=text('"Fecha Terminal" IS NULL'),
+        ),
+        {"schema": "alocreditindicators"},
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, nullable=False, index=True)
@@ -1,11 +1,13 @@
 """
 Servicio de configuracion dinamica de asignacion y auditoria de cambios.
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pathlib import Path
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 from sqlalchemy import desc
 
@@ -36,6 +38,19 @@ class AssignmentRuntimeConfig:
         return self.serlefin_percent / 100.0
 
 
+# Cache por proceso de la configuracion activa: cambia muy poco y se lee en
+# cada corrida. update_assignment_config la invalida.
+_CONFIG_CACHE_TTL_SECONDS = 60.0
+_config_cache_lock = threading.Lock()
+_config_cache: Optional[Tuple[float, AssignmentRuntimeConfig]] = None
+
+
+def _invalidate_config_cache() -> None:
+    global _config_cache
+    with _config_cache_lock:
+        _config_cache = None
+
+
 class RuntimeConfigService:
     """Gestiona configuracion activa y auditoria."""
 
@@ -59,13 +74,19 @@ class RuntimeConfigService:
             session.add(config)
 
     def get_assignment_config(self) -> AssignmentRuntimeConfig:
+        global _config_cache
+        with _config_cache_lock:
+            cached = _config_cache
+        if cached is not None and time.monotonic() - cached[0] < _CONFIG_CACHE_TTL_SECONDS:
+            return replace(cached[1])
+
         self.initialize_defaults_if_needed()
         with get_runtime_config_session() as session:
             config = session.get(RuntimeAssignmentConfig, 1)
             if not config:
                 raise RuntimeError("No se pudo cargar la configuracion de asignacion")
 
-            return AssignmentRuntimeConfig(
+            runtime_config = AssignmentRuntimeConfig(
                 serlefin_percent=float(config.serlefin_percent),
                 cobyser_percent=float(config.cobyser_percent),
                 min_days=int(config.min_days),
@@ -74,6 +95,10 @@ class RuntimeConfigService:
                 updated_at=config.updated_at or datetime.utcnow(),
             )
 
+        with _config_cache_lock:
+            _config_cache = (time.monotonic(), runtime_config)
+        return replace(runtime_config)
+
     def update_assignment_config(
         self,
         *,
@@ -84,6 +109,31 @@ class RuntimeConfigService:
         max_days: int,
         reason: str = "",
         client_ip: Optional[str] = None,
+    ) -> Dict[str, object]:
+        # Se invalida despues del commit para no recachear valores viejos.
+        try:
+            return self._update_assignment_config(
+                actor_email=actor_email,
+                serlefin_percent=serlefin_percent,
+                cobyser_percent=cobyser_percent,
+                min_days=min_days,
+                max_days=max_days,
+                reason=reason,
+                client_ip=client_ip,
+            )
+        finally:
+            _invalidate_config_cache()
+
+    def _update_assignment_config(
+        self,
+        *,
+        actor_email: str,
+        serlefin_percent: float,
+        cobyser_percent: float,
+        min_days: int,
+        max_days: int,
+        reason: str = "",
+        client_ip: Optional[str] = None,
     ) -> Dict[str, object]:
         actor_email = (actor_email or "").strip().lower()
         reason = (reason or "").strip()
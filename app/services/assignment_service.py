@@ -4,14 +4,29 @@ Implementa la lÃ³gica de contratos fijos, limpieza y balanceo configurable.
 """
 import logging
 import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Set, Any, Optional, Tuple
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+from psycopg2.extras import execute_values
 from sqlalchemy.orm import Session
-from sqlalchemy import bindparam, text
+from sqlalchemy import bindparam, select, text
 from app.core.config import settings
-from app.core.dpd import ASSIGNMENT_DPD_ORDER, get_assignment_dpd_range, get_dpd_range
+from app.core.dpd import (
+    ASSIGNMENT_DPD_ORDER,
+    get_assignment_dpd_bucket_index,
+    get_assignment_dpd_range_by_index,
+    get_dpd_range,
+)
+from app.database.bulk import (
+    COPY_INSERT_THRESHOLD,
+    copy_insert_on_conflict_returning,
+    delete_returning,
+    insert_on_conflict_returning,
+)
 from app.database.models import ContractAdvisor
 from app.runtime_config.service import AssignmentRuntimeConfig, RuntimeConfigService
 from app.services.blacklist_service import blacklist_service
@@ -22,6 +37,38 @@ from app.services.manual_fixed_service import ManualFixedService
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=4096)
+def _weighted_sequence(
+    total: int,
+    serlefin_ratio: float,
+    initial_count_81: int,
+    initial_count_45: int,
+) -> Tuple[int, ...]:
+    """Secuencia 81/45 por deficit de peso; memoizada por (total, ratio, i81, i45)."""
+    sequence: List[int] = []
+    count_81 = initial_count_81
+    count_45 = initial_count_45
+
+    for index in range(total):
+        expected_total = initial_count_81 + initial_count_45 + index + 1
+        deficit_81 = expected_total * serlefin_ratio - count_81
+        deficit_45 = expected_total * (1 - serlefin_ratio) - count_45
+
+        if deficit_81 >= deficit_45:
+            sequence.append(81)
+            count_81 += 1
+        else:
+            sequence.append(45)
+            count_45 += 1
+
+    return tuple(sequence)
+
+
+def _flatten(assignments_by_user: Dict[int, Any]) -> Set[int]:
+    """Une en un solo set los contratos de un dict {user_id: contratos}."""
+    return set().union(*assignments_by_user.values())
+
+
 class AssignmentService:
     """
     Servicio de asignaciÃ³n de contratos a asesores.
@@ -169,9 +216,11 @@ class AssignmentService:
     def refresh_estado_actual_for_assignments(
         self,
         current_assignments: Dict[int, Set[int]],
+        days_map: Optional[Dict[int, int]] = None,
     ) -> Dict[str, int]:
         """
         Actualiza estado_actual para contratos actualmente asignados.
+        days_map: dias de atraso ya conocidos en la corrida; solo se consultan los faltantes.
         """
         stats = {
             "contracts_considered": 0,
@@ -215,11 +264,21 @@ class AssignmentService:
 
         dpd_map: Dict[int, Optional[str]] = {}
         try:
-            days_map = self._require_contract_service().get_days_overdue_for_contracts(
-                sorted_contract_ids
-            )
+            known_days = days_map or {}
+            missing_days = [
+                contract_id
+                for contract_id in sorted_contract_ids
+                if contract_id not in known_days
+            ]
+            resolved_days = dict(known_days)
+            if missing_days:
+                resolved_days.update(
+                    self._require_contract_service().get_days_overdue_for_contracts(
+                        missing_days
+                    )
+                )
             for contract_id in sorted_contract_ids:
-                days = days_map.get(contract_id)
+                days = resolved_days.get(contract_id)
                 dpd_map[contract_id] = get_dpd_range(
                     int(days) if days is not None else None
                 )
@@ -355,26 +414,14 @@ class AssignmentService:
 
         Ejemplo con total=3 y ratio 0.6 => [81, 45, 81]
         """
-        sequence: List[int] = []
-        count_81 = int(initial_count_81)
-        count_45 = int(initial_count_45)
-
-        for index in range(total):
-            expected_total = initial_count_81 + initial_count_45 + index + 1
-            expected_81 = expected_total * serlefin_ratio
-            expected_45 = expected_total * (1 - serlefin_ratio)
-
-            deficit_81 = expected_81 - count_81
-            deficit_45 = expected_45 - count_45
-
-            if deficit_81 >= deficit_45:
-                sequence.append(81)
-                count_81 += 1
-            else:
-                sequence.append(45)
-                count_45 += 1
-
-        return sequence
+        return list(
+            _weighted_sequence(
+                int(total),
+                float(serlefin_ratio),
+                int(initial_count_81),
+                int(initial_count_45),
+            )
+        )
 
     @staticmethod
     def _compute_house_quotas(total: int, serlefin_ratio: float) -> Dict[int, int]:
@@ -414,24 +461,18 @@ class AssignmentService:
         if total_int == 0:
             return []
 
-        sequence: List[int] = []
-        assigned = {81: 0, 45: 0}
-        next_user = 81 if first_user not in {45, 81} else first_user
-
-        while len(sequence) < total_int:
-            preferred = next_user
-            alternate = 45 if preferred == 81 else 81
-
-            if assigned[preferred] < int(quotas.get(preferred, 0)):
-                chosen = preferred
-            elif assigned[alternate] < int(quotas.get(alternate, 0)):
-                chosen = alternate
-            else:
-                break
+        first = 81 if first_user not in {45, 81} else first_user
+        second = 45 if first == 81 else 81
+        quota_first = max(0, int(quotas.get(first, 0)))
+        quota_second = max(0, int(quotas.get(second, 0)))
 
-            sequence.append(chosen)
-            assigned[chosen] += 1
-            next_user = alternate
+        # Alterna first/second mientras ambas casas tengan cupo y luego completa
+        # con la casa que aun tenga cupo; se arma por slices, sin bucle por item.
+        paired = min(quota_first, quota_second)
+        sequence: List[int] = [first, second] * paired
+        sequence.extend([first] * (quota_first - paired))
+        sequence.extend([second] * (quota_second - paired))
+        del sequence[total_int:]
 
         return sequence
 
@@ -512,12 +553,13 @@ class AssignmentService:
             return stats
 
         try:
-            active_rows = self.postgres_session.query(
-                ContractAdvisor.user_id,
+            active_rows = delete_returning(
+                self.postgres_session,
+                ContractAdvisor,
                 ContractAdvisor.contract_id,
-            ).filter(
-                ContractAdvisor.contract_id.in_(blocked_ids)
-            ).all()
+                blocked_ids,
+                returning=[ContractAdvisor.user_id, ContractAdvisor.contract_id],
+            )
 
             if not active_rows:
                 return stats
@@ -540,14 +582,12 @@ class AssignmentService:
             history_stats = self.history_service.close_assignments(
                 contracts_removed,
                 terminal_metadata=terminal_metadata,
+                commit=False,
             )
             stats["history_closed"] = int(history_stats.get("total_closed", 0))
 
-            deleted_count = self.postgres_session.query(ContractAdvisor).filter(
-                ContractAdvisor.contract_id.in_(blocked_ids)
-            ).delete(synchronize_session=False)
             self.postgres_session.commit()
-            stats["removed_from_contract_advisors"] = int(deleted_count or 0)
+            stats["removed_from_contract_advisors"] = len(active_rows)
 
             logger.warning(
                 "Lista negra aplicada a asignaciones activas: encontrados=%s, eliminados=%s, historial_cerrado=%s",
@@ -589,12 +629,13 @@ class AssignmentService:
             return stats
 
         try:
-            active_rows = self.postgres_session.query(
-                ContractAdvisor.user_id,
+            active_rows = delete_returning(
+                self.postgres_session,
+                ContractAdvisor,
                 ContractAdvisor.contract_id,
-            ).filter(
-                ContractAdvisor.contract_id.in_(promise_ids)
-            ).all()
+                promise_ids,
+                returning=[ContractAdvisor.user_id, ContractAdvisor.contract_id],
+            )
 
             if not active_rows:
                 logger.info(
@@ -619,14 +660,12 @@ class AssignmentService:
             history_stats = self.history_service.close_assignments(
                 contracts_removed,
                 terminal_metadata=terminal_metadata,
+                commit=False,
             )
             stats["history_closed"] = int(history_stats.get("total_closed", 0))
 
-            deleted_count = self.postgres_session.query(ContractAdvisor).filter(
-                ContractAdvisor.contract_id.in_(promise_ids)
-            ).delete(synchronize_session=False)
             self.postgres_session.commit()
-            stats["removed_from_contract_advisors"] = int(deleted_count or 0)
+            stats["removed_from_contract_advisors"] = len(active_rows)
 
             logger.info(
                 "Enforcement promesas activas: encontrados=%s, eliminados=%s, "
@@ -809,17 +848,15 @@ class AssignmentService:
         current_assignments = {user_id: set() for user_id in settings.USER_IDS}
         
         try:
-            assignments = self.postgres_session.query(
-                ContractAdvisor.user_id,
-                ContractAdvisor.contract_id,
-            ).filter(
-                ContractAdvisor.user_id.in_(settings.USER_IDS)
+            # Core select: solo tuplas (user_id, contract_id), sin identity map.
+            rows = self.postgres_session.execute(
+                select(ContractAdvisor.user_id, ContractAdvisor.contract_id).where(
+                    ContractAdvisor.user_id.in_(settings.USER_IDS)
+                )
             ).all()
 
-            for user_id, contract_id in assignments:
-                user_id_int = int(user_id)
-                if user_id_int in current_assignments:
-                    current_assignments[user_id_int].add(int(contract_id))
+            for user_id, contract_id in rows:
+                current_assignments[user_id].add(contract_id)
             
             logger.info(f"âœ“ Asignaciones actuales: Usuario 45: {len(current_assignments[45])}, Usuario 81: {len(current_assignments[81])}")
             
@@ -860,10 +897,12 @@ class AssignmentService:
         current_assignments: Dict[int, Set[int]],
         serlefin_ratio: float,
         blocked_contract_ids: Optional[Set[int]] = None,
+        flat_current: Optional[Set[int]] = None,
     ) -> tuple[Dict[int, List[int]], Dict[int, int]]:
         """
         Balancea contratos nuevos por bucket DPD.
         En cada bucket aplica cuota configurable 60/40 (o valor activo).
+        flat_current permite reutilizar el set plano ya calculado por el llamador.
         """
         serlefin_ratio = max(0.0, min(1.0, float(serlefin_ratio)))
         cobyser_ratio = 1.0 - serlefin_ratio
@@ -874,55 +913,77 @@ class AssignmentService:
         )
 
         new_assignments: Dict[int, List[int]] = {45: [], 81: []}
+        if not contracts_with_days:
+            logger.info("No hay contratos candidatos para balancear")
+            return new_assignments, {}
         blocked_ids = blocked_contract_ids or set()
-        contracts_days_map: Dict[int, int] = {
-            int(contract["contract_id"]): int(contract["days_overdue"])
-            for contract in contracts_with_days
-            if int(contract["contract_id"]) not in blocked_ids
-        }
-
-        valid_contract_ids = set(contracts_days_map.keys())
 
-        all_currently_assigned_any: Set[int] = set()
-        for user_id in settings.USER_IDS:
-            all_currently_assigned_any.update(current_assignments.get(user_id, set()))
-
-        contracts_new: List[Dict[str, int]] = []
-        for contract in contracts_with_days:
-            contract_id = int(contract["contract_id"])
-            if contract_id in blocked_ids:
-                continue
-            if contract_id in all_currently_assigned_any:
-                continue
-            contracts_new.append(
+        # Tipado en una sola pasada: evita int(...) repetidos por contrato.
+        ids = np.asarray(
+            [contract["contract_id"] for contract in contracts_with_days],
+            dtype=np.int64,
+        )
+        days = np.asarray(
+            [contract["days_overdue"] for contract in contracts_with_days],
+            dtype=np.int32,
+        )
+        total_candidates = int(ids.size)
+        blocked_count = 0
+        if blocked_ids and ids.size:
+            blocked_mask = np.isin(ids, np.fromiter(blocked_ids, dtype=np.int64))
+            blocked_count = int(np.unique(ids[blocked_mask]).size)
+            ids = ids[~blocked_mask]
+            days = days[~blocked_mask]
+
+        contracts_days_map: Dict[int, int] = dict(zip(ids.tolist(), days.tolist()))
+
+        all_currently_assigned_any: Set[int] = (
+            flat_current
+            if flat_current is not None
+            else _flatten(
                 {
-                    "contract_id": contract_id,
-                    "days_overdue": int(contract["days_overdue"]),
+                    user_id: current_assignments.get(user_id, set())
+                    for user_id in settings.USER_IDS
                 }
             )
+        )
+
+        already_assigned_count = 0
+        if all_currently_assigned_any and ids.size:
+            assigned_mask = np.isin(
+                ids,
+                np.fromiter(all_currently_assigned_any, dtype=np.int64),
+            )
+            already_assigned_count = int(np.unique(ids[assigned_mask]).size)
+            ids = ids[~assigned_mask]
+            days = days[~assigned_mask]
 
         logger.info(
             "Contratos candidatos: total=%s, ya_asignados=%s, bloqueados=%s, nuevos=%s",
-            len(contracts_with_days),
-            len(all_currently_assigned_any & valid_contract_ids),
-            len(blocked_ids & set(int(c["contract_id"]) for c in contracts_with_days)),
-            len(contracts_new),
+            total_candidates,
+            already_assigned_count,
+            blocked_count,
+            int(ids.size),
         )
 
-        if not contracts_new:
+        if not ids.size:
             logger.info("No hay contratos nuevos para balancear")
             return new_assignments, contracts_days_map
 
-        contracts_new.sort(key=lambda item: (int(item["days_overdue"]), int(item["contract_id"])))
-        contracts_by_bucket: Dict[str, List[Dict[str, int]]] = {}
-        skipped_without_bucket = 0
-        for contract in contracts_new:
-            days_overdue = int(contract["days_overdue"])
-            dpd_range = get_assignment_dpd_range(days_overdue)
-            if not dpd_range:
-                skipped_without_bucket += 1
-                continue
-            contracts_by_bucket.setdefault(dpd_range, []).append(contract)
+        # Orden por (dias, contrato) ascendente; como el bucket es monotono en
+        # dias, cada bucket queda en un tramo contiguo y ya ordenado.
+        order = np.lexsort((ids, days))
+        ids = ids[order]
+        bucket_idx = get_assignment_dpd_bucket_index(days[order])
+        cut_points = np.flatnonzero(np.diff(bucket_idx)) + 1
+
+        contracts_by_bucket: Dict[str, List[int]] = {}
+        for start, bucket_ids in zip(
+            np.concatenate(([0], cut_points)),
+            np.split(ids, cut_points),
+        ):
+            dpd_range = get_assignment_dpd_range_by_index(bucket_idx[start])
+            contracts_by_bucket[dpd_range] = bucket_ids.tolist()
 
         range_stats: Dict[str, Dict[str, int]] = {
             dpd_range: {
@@ -961,8 +1022,7 @@ class AssignmentService:
             range_stats[dpd_range]["target_81"] = int(quotas.get(81, 0))
             range_stats[dpd_range]["target_45"] = int(quotas.get(45, 0))
 
-            for contract, user_id in zip(bucket_contracts, user_sequence):
-                contract_id = int(contract["contract_id"])
+            for contract_id, user_id in zip(bucket_contracts, user_sequence):
                 new_assignments[user_id].append(contract_id)
                 if user_id == 81:
                     range_stats[dpd_range]["assigned_81"] += 1
@@ -987,11 +1047,6 @@ class AssignmentService:
             "  Total insertables en esta corrida: %s",
             total_assigned_now,
         )
-        if skipped_without_bucket > 0:
-            logger.warning(
-                "  Contratos omitidos sin bucket DPD valido: %s",
-                skipped_without_bucket,
-            )
 
         for dpd_range in ASSIGNMENT_DPD_ORDER:
             stats = range_stats.get(dpd_range, {})
@@ -1033,9 +1088,7 @@ class AssignmentService:
         days_cache = contracts_days_map or {}
 
         try:
-            all_contract_ids: Set[int] = set()
-            for contract_ids in assignments.values():
-                all_contract_ids.update(contract_ids)
+            all_contract_ids: Set[int] = _flatten(assignments)
 
             if not all_contract_ids:
                 logger.info("No hay contratos para insertar")
@@ -1056,71 +1109,65 @@ class AssignmentService:
                 logger.info("No hay contratos elegibles para insertar")
                 return stats
 
-            logger.info(
-                f"Verificando duplicados para {len(eligible_contract_ids)} contratos unicos..."
-            )
-            existing_assignments = self.postgres_session.query(
-                ContractAdvisor.contract_id
-            ).filter(
-                ContractAdvisor.contract_id.in_(eligible_contract_ids)
-            ).all()
-
-            existing_contract_ids = set(int(row[0]) for row in existing_assignments)
-            rows_to_insert: List[Dict[str, Any]] = []
             states_cache: Dict[int, str] = {}
+            try:
+                states_cache = self._require_contract_service().get_current_state_for_contracts(
+                    sorted(eligible_contract_ids)
+                )
+            except Exception as estado_error:
+                stats["estado_lookup_failed"] = len(eligible_contract_ids)
+                logger.warning(
+                    "No se pudo consultar estado_actual para insercion masiva. "
+                    "Se insertara con valor por defecto. Error: %s",
+                    estado_error,
+                )
 
-            if eligible_contract_ids:
-                try:
-                    states_cache = self._require_contract_service().get_current_state_for_contracts(
-                        sorted(eligible_contract_ids)
-                    )
-                except Exception as estado_error:
-                    stats["estado_lookup_failed"] = len(eligible_contract_ids)
-                    logger.warning(
-                        "No se pudo consultar estado_actual para insercion masiva. "
-                        "Se insertara con valor por defecto. Error: %s",
-                        estado_error,
-                    )
-
+            rows_to_insert: List[Tuple[int, int, str]] = []
+            queued_contract_ids: Set[int] = set()
             for user_id, contract_ids in assignments.items():
                 new_assignments[user_id] = []
-
                 for contract_id in contract_ids:
                     contract_id = int(contract_id)
                     if contract_id not in eligible_contract_ids:
                         continue
-                    if contract_id in existing_contract_ids:
+                    if contract_id in queued_contract_ids:
                         continue
-
+                    queued_contract_ids.add(contract_id)
                     rows_to_insert.append(
-                        {
-                            "contract_id": contract_id,
-                            "user_id": int(user_id),
-                            "estado_actual": str(
-                                states_cache.get(contract_id, "PENDIENTE")
-                            ),
-                        }
+                        (
+                            contract_id,
+                            int(user_id),
+                            str(states_cache.get(contract_id, "PENDIENTE")),
+                        )
                     )
-                    new_assignments[user_id].append(contract_id)
-                    existing_contract_ids.add(contract_id)
-
-                    stats["inserted_total"] += 1
-                    if user_id in settings.COBYSER_USERS:
-                        stats["inserted_cobyser"] += 1
-                    elif user_id in settings.SERLEFIN_USERS:
-                        stats["inserted_serlefin"] += 1
 
-            if rows_to_insert:
-                self.postgres_session.bulk_insert_mappings(
+            if len(rows_to_insert) > COPY_INSERT_THRESHOLD:
+                # Lotes grandes: COPY a tabla temporal + INSERT ... ON CONFLICT.
+                logger.info("Insertando %s contratos unicos con COPY...", len(rows_to_insert))
+                inserted_rows = copy_insert_on_conflict_returning(
+                    self.postgres_session,
                     ContractAdvisor,
-                    rows_to_insert,
+                    [
+                        {"contract_id": contract_id, "user_id": user_id, "estado_actual": estado}
+                        for contract_id, user_id, estado in rows_to_insert
+                    ],
+                    conflict_columns=[ContractAdvisor.contract_id],
+                    returning=[ContractAdvisor.contract_id, ContractAdvisor.user_id],
                 )
+            else:
+                inserted_rows = self._insert_new_assignments(rows_to_insert)
 
-            self.postgres_session.commit()
+            for contract_id, user_id in inserted_rows:
+                new_assignments.setdefault(user_id, []).append(contract_id)
+            inserted_contract_ids: List[int] = [row[0] for row in inserted_rows]
 
-            inserted_contract_ids: List[int] = []
-            for contract_ids in new_assignments.values():
-                inserted_contract_ids.extend(contract_ids)
+            # Conteos agregados por usuario sobre lo devuelto por RETURNING.
+            stats["inserted_total"] = len(inserted_rows)
+            user_house = settings.user_house
+            for user_id, contract_ids in new_assignments.items():
+                house = user_house.get(user_id)
+                if house:
+                    stats[f"inserted_{house}"] += len(contract_ids)
 
             history_stats = {"total_registered": 0}
             if inserted_contract_ids:
@@ -1154,8 +1201,12 @@ class AssignmentService:
                     new_assignments,
                     assignment_metadata=assignment_metadata,
                     default_tipo="ASIGNACION",
+                    commit=False,
                 )
 
+            # Insercion + historial en una sola transaccion.
+            self.postgres_session.commit()
+
             logger.info("Asignaciones guardadas:")
             logger.info(f"  Total: {stats['inserted_total']}")
             logger.info(f"  COBYSER: {stats['inserted_cobyser']}")
@@ -1171,14 +1222,46 @@ class AssignmentService:
             self.postgres_session.rollback()
             raise
 
+    def _insert_new_assignments(
+        self,
+        rows: List[Tuple[int, int, str]],
+    ) -> List[Tuple[int, int]]:
+        """
+        INSERT con execute_values + ON CONFLICT DO NOTHING RETURNING.
+        RETURNING indica exactamente que filas quedaron insertadas.
+        """
+        logger.info(
+            "Insertando %s contratos unicos (ON CONFLICT DO NOTHING)...",
+            len(rows),
+        )
+        if not rows:
+            return []
+        raw_connection = self.postgres_session.connection().connection
+        with raw_connection.cursor() as cursor:
+            return execute_values(
+                cursor,
+                """
+                INSERT INTO alocreditindicators.contract_advisors
+                    (contract_id, user_id, estado_actual)
+                VALUES %s
+                ON CONFLICT (contract_id) DO NOTHING
+                RETURNING contract_id, user_id
+                """,
+                rows,
+                page_size=5000,
+                fetch=True,
+            )
+
     def ensure_fixed_contracts_assigned(
         self,
         fixed_contracts: Dict[int, Set[int]],
         max_days_threshold: int,
         excluded_contract_ids: Optional[Set[int]] = None,
+        days_map: Optional[Dict[int, int]] = None,
     ) -> Dict[str, int]:
         """
         Asegura que todos los contratos fijos esten en contract_advisors.
+        days_map: dias de atraso ya conocidos en la corrida; solo se consultan los faltantes.
         """
         logger.info("Verificando que todos los contratos fijos esten asignados...")
 
@@ -1211,25 +1294,27 @@ class AssignmentService:
                 for user_id, contract_id in assigned_rows
             }
 
-            missing_by_user: Dict[int, Set[int]] = {45: set(), 81: set()}
-            missing_all: Set[int] = set()
-
-            for user_id in settings.USER_IDS:
-                user_fixed_contracts = {
+            fixed_by_user: Dict[int, Set[int]] = {
+                user_id: {
                     int(contract_id)
                     for contract_id in fixed_contracts.get(user_id, set())
-                    if int(contract_id) not in blocked_ids
                 }
-                if not user_fixed_contracts:
-                    continue
-
-                for contract_id in user_fixed_contracts:
-                    assigned_user = assigned_user_by_contract.get(contract_id)
-                    if assigned_user is None:
-                        missing_by_user[user_id].add(contract_id)
-                        missing_all.add(contract_id)
-                        continue
+                - blocked_ids
+                for user_id in settings.USER_IDS
+            }
+            # Faltantes de todos los usuarios en una sola diferencia; los dias de
+            # atraso se consultan despues en una unica llamada para todos.
+            missing_all: Set[int] = (
+                _flatten(fixed_by_user) - assigned_user_by_contract.keys()
+            )
+            missing_by_user: Dict[int, Set[int]] = {
+                user_id: contract_ids & missing_all
+                for user_id, contract_ids in fixed_by_user.items()
+            }
 
+            for user_id, user_fixed_contracts in fixed_by_user.items():
+                for contract_id in user_fixed_contracts - missing_all:
+                    assigned_user = assigned_user_by_contract[contract_id]
                     if assigned_user == int(user_id):
                         stats["already_assigned"] += 1
                         continue
@@ -1250,9 +1335,19 @@ class AssignmentService:
                 )
                 return stats
 
-            missing_days_map = self._require_contract_service().get_days_overdue_for_contracts(
-                sorted(missing_all)
-            )
+            known_days = days_map or {}
+            missing_days_map = {
+                contract_id: known_days[contract_id]
+                for contract_id in missing_all
+                if contract_id in known_days
+            }
+            to_fetch = sorted(missing_all - missing_days_map.keys())
+            if to_fetch:
+                missing_days_map.update(
+                    self._require_contract_service().get_days_overdue_for_contracts(
+                        to_fetch
+                    )
+                )
             eligible_missing = {
                 int(contract_id)
                 for contract_id in missing_all
@@ -1280,14 +1375,8 @@ class AssignmentService:
             rows_to_insert: List[Dict[str, Any]] = []
             for user_id in settings.USER_IDS:
                 ordered_missing = sorted(
-                    contract_id
-                    for contract_id in missing_by_user.get(user_id, set())
-                    if contract_id in eligible_missing
+                    missing_by_user.get(user_id, set()) & eligible_missing
                 )
-                if not ordered_missing:
-                    continue
-
-                new_fixed_assignments[user_id] = ordered_missing
                 for contract_id in ordered_missing:
                     rows_to_insert.append(
                         {
@@ -1299,12 +1388,6 @@ class AssignmentService:
                         }
                     )
 
-                    stats["inserted_total"] += 1
-                    if user_id == 45:
-                        stats["inserted_cobyser"] += 1
-                    elif user_id == 81:
-                        stats["inserted_serlefin"] += 1
-
             if not rows_to_insert:
                 logger.info(
                     "No hubo contratos fijos elegibles dentro del tope %s",
@@ -1313,15 +1396,31 @@ class AssignmentService:
                 return stats
 
             self._ensure_estado_actual_column()
-            self.postgres_session.bulk_insert_mappings(
+            # La lectura previa solo cubre USER_IDS; ON CONFLICT evita la carrera
+            # con contratos ya tomados por otro usuario o por otra corrida.
+            inserted_rows = insert_on_conflict_returning(
+                self.postgres_session,
                 ContractAdvisor,
                 rows_to_insert,
+                conflict_columns=[ContractAdvisor.contract_id],
+                returning=[ContractAdvisor.contract_id, ContractAdvisor.user_id],
             )
-            self.postgres_session.commit()
 
-            inserted_contract_ids: List[int] = []
-            for contract_ids in new_fixed_assignments.values():
-                inserted_contract_ids.extend(contract_ids)
+            for contract_id, user_id in inserted_rows:
+                new_fixed_assignments.setdefault(user_id, []).append(contract_id)
+            inserted_contract_ids: List[int] = [row[0] for row in inserted_rows]
+
+            stats["inserted_total"] = len(inserted_rows)
+            stats["inserted_cobyser"] = len(new_fixed_assignments.get(45, []))
+            stats["inserted_serlefin"] = len(new_fixed_assignments.get(81, []))
+
+            conflicted = len(rows_to_insert) - len(inserted_rows)
+            if conflicted > 0:
+                stats["already_assigned"] += conflicted
+                logger.info(
+                    "Contratos fijos omitidos por conflicto (ya asignados): %s",
+                    conflicted,
+                )
 
             days_map = {
                 int(contract_id): int(missing_days_map.get(contract_id, 0))
@@ -1341,7 +1440,10 @@ class AssignmentService:
                 new_fixed_assignments,
                 assignment_metadata=assignment_metadata,
                 default_tipo="FIJO_PROMESA_ACTIVA",
+                commit=False,
             )
+            # Insercion + historial en una sola transaccion.
+            self.postgres_session.commit()
 
             logger.info("Contratos fijos por promesa activa insertados:")
             logger.info("  Total: %s", stats["inserted_total"])
@@ -1450,56 +1552,66 @@ class AssignmentService:
                 self.enforce_blacklist_on_active_assignments(blocked_contract_ids)
             )
 
-            fixed_contracts = self.get_fixed_contracts()
-            if blocked_contract_ids:
-                fixed_contracts = {
-                    user_id: {
-                        int(contract_id)
-                        for contract_id in contract_ids
-                        if int(contract_id) not in blocked_contract_ids
+            # Consulta principal a MySQL en paralelo con los pasos de PostgreSQL
+            # (promesas, enforcement y asignaciones actuales). Cada hilo usa solo
+            # su propia sesion; las promesas activas se filtran luego en memoria.
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="arrears") as executor:
+                arrears_future = executor.submit(
+                    self._require_contract_service().get_contracts_with_arrears,
+                    min_days=effective_min_days,
+                    max_days=effective_max_days,
+                    excluded_contract_ids=blocked_contract_ids or None,
+                )
+
+                fixed_contracts = self.get_fixed_contracts()
+                if blocked_contract_ids:
+                    fixed_contracts = {
+                        user_id: {
+                            int(contract_id)
+                            for contract_id in contract_ids
+                            if int(contract_id) not in blocked_contract_ids
+                        }
+                        for user_id, contract_ids in fixed_contracts.items()
                     }
-                    for user_id, contract_ids in fixed_contracts.items()
+
+                # Contratos con promesa activa se excluyen de asignacion
+                promise_contract_ids: Set[int] = _flatten(fixed_contracts)
+
+                results["fixed_contracts_count"] = {
+                    "cobyser_45": len(fixed_contracts.get(45, set())),
+                    "serlefin_81": len(fixed_contracts.get(81, set())),
                 }
 
-            # Contratos con promesa activa se excluyen de asignacion
-            promise_contract_ids: Set[int] = set()
-            for contract_ids in fixed_contracts.values():
-                promise_contract_ids.update(contract_ids)
+                logger.info(
+                    "Contratos con promesa activa excluidos de asignacion: %s",
+                    len(promise_contract_ids),
+                )
 
-            results["fixed_contracts_count"] = {
-                "cobyser_45": len(fixed_contracts.get(45, set())),
-                "serlefin_81": len(fixed_contracts.get(81, set())),
-            }
+                # Remover asignaciones activas de contratos con promesa activa
+                results["promise_enforcement_stats"] = (
+                    self.enforce_promises_on_active_assignments(promise_contract_ids)
+                )
 
-            logger.info(
-                "Contratos con promesa activa excluidos de asignacion: %s",
-                len(promise_contract_ids),
-            )
+                results["promise_excluded_count"] = len(promise_contract_ids)
+                results["fixed_insert_stats"] = {
+                    "skipped": "contratos con promesa activa no se asignan",
+                    "promise_excluded": len(promise_contract_ids),
+                }
 
-            # Remover asignaciones activas de contratos con promesa activa
-            results["promise_enforcement_stats"] = (
-                self.enforce_promises_on_active_assignments(promise_contract_ids)
-            )
+                # Excluir contratos con promesa activa del balanceo
+                excluded_from_assignment = blocked_contract_ids | promise_contract_ids
 
-            results["promise_excluded_count"] = len(promise_contract_ids)
-            results["fixed_insert_stats"] = {
-                "skipped": "contratos con promesa activa no se asignan",
-                "promise_excluded": len(promise_contract_ids),
-            }
+                current_assignments = self.get_current_assignments()
 
-            # Excluir contratos con promesa activa del balanceo
-            excluded_from_assignment = blocked_contract_ids | promise_contract_ids
+                contracts_with_arrears = arrears_future.result()
 
-            current_assignments = self.get_current_assignments()
+            if promise_contract_ids:
+                contracts_with_arrears = [
+                    contract
+                    for contract in contracts_with_arrears
+                    if int(contract["contract_id"]) not in promise_contract_ids
+                ]
 
-            # Consulta principal a MySQL en una sola llamada simple.
-            # El filtrado de lista negra se aplica en memoria para evitar queries
-            # enormes cuando el TXT tenga miles de contratos bloqueados.
-            contracts_with_arrears = self._require_contract_service().get_contracts_with_arrears(
-                min_days=effective_min_days,
-                max_days=effective_max_days,
-                excluded_contract_ids=excluded_from_assignment or None,
-            )
             results["contracts_to_assign"] = [
                 contract["contract_id"]
                 for contract in contracts_with_arrears
@@ -1510,6 +1622,7 @@ class AssignmentService:
                 current_assignments=current_assignments,
                 serlefin_ratio=runtime_config.serlefin_ratio,
                 blocked_contract_ids=excluded_from_assignment,
+                flat_current=_flatten(current_assignments),
             )
             results["balance_stats"] = {
                 user_id: len(contract_ids)
@@ -1525,15 +1638,15 @@ class AssignmentService:
             results["insert_stats"] = insert_stats
 
             current_assignments_after_insert = self.get_current_assignments()
+            # Reutiliza los dias ya obtenidos en la consulta de mora.
             estado_stats = self.refresh_estado_actual_for_assignments(
-                current_assignments_after_insert
+                current_assignments_after_insert,
+                days_map=contracts_days_map,
             )
             results["estado_actual_update_stats"] = estado_stats
 
-            results["final_assignments"] = {
-                user_id: contract_ids
-                for user_id, contract_ids in new_assignments.items()
-            }
+            # new_assignments ya es {user_id: [contract_ids]} y no se modifica despues.
+            results["final_assignments"] = new_assignments
             results["success"] = True
 
             logger.info("=" * 80)
@@ -1752,25 +1865,28 @@ class AssignmentService:
                 metrics.get("cobyser_percent", 0),
             )
 
-            contracts_81 = report_service_extended.get_assigned_contracts_for_house(
-                settings.SERLEFIN_USERS
-            )
-            file_81, _ = report_service_extended.generate_report_for_user(
-                user_id=81,
-                user_name="Serlefin",
-                contracts=contracts_81,
-            )
+            def _build_report(user_ids: List[int], user_id: int, user_name: str):
+                contracts = report_service_extended.get_assigned_contracts_for_house(user_ids)
+                file_path, _ = report_service_extended.generate_report_for_user(
+                    user_id=user_id,
+                    user_name=user_name,
+                    contracts=contracts,
+                )
+                return contracts, file_path
+
+            # Cada informe abre sus propias conexiones: se generan en paralelo.
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                future_81 = executor.submit(
+                    _build_report, settings.SERLEFIN_USERS, 81, "Serlefin"
+                )
+                future_45 = executor.submit(
+                    _build_report, settings.COBYSER_USERS, 45, "Cobyser"
+                )
+                contracts_81, file_81 = future_81.result()
+                contracts_45, file_45 = future_45.result()
+
             if file_81:
                 generated_report_files.append(file_81)
-
-            contracts_45 = report_service_extended.get_assigned_contracts_for_house(
-                settings.COBYSER_USERS
-            )
-            file_45, _ = report_service_extended.generate_report_for_user(
-                user_id=45,
-                user_name="Cobyser",
-                contracts=contracts_45,
-            )
             if file_45:
                 generated_report_files.append(file_45)
 
@@ -1830,6 +1946,8 @@ class AssignmentService:
                 else "Se adjuntan las bases disponibles en esta corrida."
             )
 
+            send_jobs: List[Dict[str, Any]] = []
+
             def _send_group(
                 recipients: List[str],
                 subject: str,
@@ -1837,22 +1955,34 @@ class AssignmentService:
                 attachments: List[str],
                 label: str,
             ) -> None:
-                nonlocal sent_ok, expected_total
                 if not recipients:
                     return
+                send_jobs.append(
+                    {
+                        "recipients": recipients,
+                        "subject": subject,
+                        "body": body,
+                        "attachments": attachments,
+                        "label": label,
+                    }
+                )
 
-                expected_total += len(recipients)
+            def _run_send_job(job: Dict[str, Any]) -> int:
+                recipients = job["recipients"]
+                # send_assignment_report toma una sesion SMTP del pool compartido
+                # (EmailService._acquire): cada hilo usa su propia sesion, que se
+                # reutiliza hasta el TTL (100 s) o 100 mensajes.
                 ok = email_service.send_assignment_report(
                     recipient=recipients,
-                    subject=subject,
-                    body=body,
-                    attachments=attachments or None,
+                    subject=job["subject"],
+                    body=job["body"],
+                    attachments=job["attachments"] or None,
                 )
                 if ok:
-                    sent_ok += len(recipients)
-                    logger.info("Correo %s enviado a grupo: %s", label, ", ".join(recipients))
-                else:
-                    logger.warning("No se pudo enviar correo %s a grupo: %s", label, ", ".join(recipients))
+                    logger.info("Correo %s enviado a grupo: %s", job["label"], ", ".join(recipients))
+                    return len(recipients)
+                logger.warning("No se pudo enviar correo %s a grupo: %s", job["label"], ", ".join(recipients))
+                return 0
 
             if cobyser_recipients:
                 cobyser_subject = "Asignacion de cartera - Cobyser (notificacion + base)"
@@ -1937,6 +2067,11 @@ class AssignmentService:
                     label="GENERAL_AMBAS_BASES",
                 )
 
+            if send_jobs:
+                expected_total = sum(len(job["recipients"]) for job in send_jobs)
+                with ThreadPoolExecutor(max_workers=len(send_jobs)) as executor:
+                    sent_ok = sum(executor.map(_run_send_job, send_jobs))
+
             if expected_total == 0:
                 logger.warning("No se ejecutaron envios: no hay destinatarios activos")
                 return False
@@ -2070,6 +2205,7 @@ class AssignmentService:
             history_stats = self.history_service.close_assignments(
                 contracts_removed,
                 terminal_metadata=terminal_metadata,
+                commit=False,
             )
             stats["history_closed"] = int(history_stats.get("total_closed", 0))
             stats["history_updated"] = int(history_stats.get("updated", 0))
@@ -2,19 +2,353 @@
 Servicio para generar informes de casa de cobranza (SERLEFIN y COBYSER)
 Mantiene la lÃ³gica original exacta del script
 """
+import importlib.util
+import io
 import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import psycopg2
+import psycopg2.pool
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# NUMERIC llega como float desde el driver: evita construir un Decimal por celda
+# que luego pandas vuelve a convertir a float (coerce_float de read_sql).
+_NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "NUMERIC_AS_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+# Pools por base (host, puerto, base, usuario, schema) compartidos entre
+# instancias del servicio: evita el handshake TCP/TLS/auth en cada informe.
+_POOL_LOCK = threading.Lock()
+_POOLS: Dict[Tuple, psycopg2.pool.ThreadedConnectionPool] = {}
+
+
+def _get_pool(db_config: Dict) -> psycopg2.pool.ThreadedConnectionPool:
+    key = (
+        db_config['host'],
+        db_config['port'],
+        db_config['database'],
+        db_config['user'],
+        db_config['options'],
+    )
+    with _POOL_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = psycopg2.pool.ThreadedConnectionPool(
+                1,
+                4,
+                host=db_config['host'],
+                user=db_config['user'],
+                password=db_config['password'],
+                dbname=db_config['database'],
+                port=db_config['port'],
+                options=db_config['options'],
+            )
+            _POOLS[key] = pool
+        return pool
+
+
+@contextmanager
+def _pooled_connection(db_config: Dict):
+    """Presta una conexion del pool; al devolverla el pool hace rollback si quedo en transaccion."""
+    pool = _get_pool(db_config)
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_report_pools() -> None:
+    """Cierra todas las conexiones de los pools de informes (apagado de la app)."""
+    with _POOL_LOCK:
+        for pool in _POOLS.values():
+            pool.closeall()
+        _POOLS.clear()
+
+
+# Tramos de dias (limite superior inclusivo) y factor/etiqueta de cada tramo;
+# el ultimo valor aplica por encima del ultimo limite.
+_TRAMOS_CAPITAL = np.array([150, 180, 300], dtype=float)
+_FACTOR_CAPITAL = np.array([1.0, 0.95, 0.90, 0.75])
+_PCT_CAPITAL = np.array(['100%', '95%', '90%', '75%'], dtype=object)
+_TRAMOS_GASTOS = np.array([90, 120, 150, 365], dtype=float)
+_FACTOR_GASTOS = np.array([0.70, 0.60, 0.50, 0.40, 0.0])
+_PCT_GASTOS = np.array(['70%', '60%', '50%', '40%', '0%'], dtype=object)
+
+
+def _round_half_up(values: np.ndarray) -> np.ndarray:
+    """ROUND(x, 0) de PostgreSQL: redondeo a entero alejandose de cero en .5 (en sitio)."""
+    signo = np.sign(values)
+    np.round(values, 6, out=values)
+    np.abs(values, out=values)
+    values += 0.5
+    np.floor(values, out=values)
+    values *= signo
+    return values
+
+
+def _opciones_en_cuotas(base: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Valor en 1, 2 y 3 cuotas; 3 cuotas solo aplica por encima de $600k."""
+    tres_cuotas = _round_half_up(base / 3)
+    tres_cuotas[~(base > 600000)] = np.nan
+    return base, _round_half_up(base / 2), tres_cuotas
+
+
+def _calcular_opciones_pago(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calcula descuentos y opciones de pago sobre columnas completas del DataFrame.
+
+    Reemplaza los CTE Descuentos, ValorFinalDescuento y OpcionesPago: las mismas
+    reglas por tramo de dias, evaluadas con numpy en lugar de por fila en SQL.
+    Las columnas se insertan tras dias_iniciales_mes y se elimina quota.
+    """
+    if 'dias_iniciales_mes' not in df.columns:
+        return df.drop(columns=['quota'], errors='ignore')
+
+    # Sin dias (NULL) se trata como el primer tramo, igual que en el SQL original.
+    dias = np.nan_to_num(
+        pd.to_numeric(df['dias_iniciales_mes'], errors='coerce').to_numpy(dtype=float),
+        nan=0.0,
+    )
+    capital = pd.to_numeric(df['capital_pendiente'], errors='coerce').to_numpy(dtype=float)
+    gastos = pd.to_numeric(df['gastos_vencidos'], errors='coerce').to_numpy(dtype=float)
+    deuda = pd.to_numeric(df['deuda_actual'], errors='coerce').to_numpy(dtype=float)
+    quota = pd.to_numeric(df['quota'], errors='coerce').to_numpy(dtype=float)
+
+    # Un searchsorted por regla da el tramo de cada fila; factor y etiqueta
+    # salen de indexar las tablas con ese tramo.
+    tramo_capital = np.searchsorted(_TRAMOS_CAPITAL, dias, side='left')
+    tramo_gastos = np.searchsorted(_TRAMOS_GASTOS, dias, side='left')
+    pct_capital = _PCT_CAPITAL[tramo_capital]
+    pct_gastos = _PCT_GASTOS[tramo_gastos]
+
+    valor_final = capital * _FACTOR_CAPITAL[tramo_capital]
+    valor_final += np.nan_to_num(gastos) * _FACTOR_GASTOS[tramo_gastos]
+    _round_half_up(valor_final)
+    opcion_2 = _opciones_en_cuotas(deuda)
+    opcion_3 = _opciones_en_cuotas(valor_final)
+    opcion_4 = _opciones_en_cuotas(capital)
+
+    columnas = {
+        '%_Pago_capital': pct_capital,
+        '%_Descuento_gastos': pct_gastos,
+        'valor_final_descuento': valor_final,
+        'valor_opcion_1': quota,
+        'valor_1_cuota_opcion_2': opcion_2[0],
+        'valor_2_cuotas_opcion_2': opcion_2[1],
+        'valor_3_cuotas_opcion_2': opcion_2[2],
+        'valor_1_cuota_opcion_3': opcion_3[0],
+        'valor_2_cuotas_opcion_3': opcion_3[1],
+        'valor_3_cuotas_opcion_3': opcion_3[2],
+        'valor_1_cuota_opcion_4': opcion_4[0],
+        'valor_2_cuotas_opcion_4': opcion_4[1],
+        'valor_3_cuotas_opcion_4': opcion_4[2],
+    }
+    df = df.drop(columns=['quota'])
+    posicion = df.columns.get_loc('dias_iniciales_mes') + 1
+    for offset, (nombre, valores) in enumerate(columnas.items()):
+        df.insert(posicion + offset, nombre, valores)
+    return df
+
+
+@lru_cache(maxsize=1)
+def _build_query_template() -> str:
+    """
+    Query SQL del informe (logica exacta del script original), construida una vez por proceso.
+    Los contratos se leen de la tabla temporal _ids cargada por _iter_dataframes.
+    """
+    return """
+WITH 
+AccSum AS (
+    SELECT
+        aa.application_id,
+        SUM(aa.price::numeric) AS total_precio_accesorios
+    FROM application_accessory aa
+    WHERE aa.application_id IN (
+        SELECT application_id FROM contract WHERE id IN (SELECT id FROM _ids)
+    )
+    GROUP BY aa.application_id
+),
+
+AccesoriosPhone AS (
+    SELECT
+        al.application_id, 
+        MAX(al.id) AS max_loan_id,
+        COALESCE(acs.total_precio_accesorios, 0::numeric) AS total_precio_accesorios
+    FROM application_loan al
+    LEFT JOIN AccSum acs ON acs.application_id = al.application_id
+    WHERE al.application_id IN (
+        SELECT application_id FROM contract WHERE id IN (SELECT id FROM _ids)
+    )
+    GROUP BY al.application_id, acs.total_precio_accesorios
+),
+
+UltimaCuotaPagadaPhone AS (
+    SELECT contract_id,
+           outstanding_principal AS capital_ultima_pagada
+    FROM (
+        SELECT
+            ca.*,
+            ROW_NUMBER() OVER (PARTITION BY ca.contract_id ORDER BY ca.period_number DESC) AS rn
+        FROM contract_amortization ca
+        WHERE ca.contract_id IN (SELECT id FROM _ids)
+          AND ca.contract_amortization_payment_status_id IN (1,5)
+    ) x
+    WHERE rn = 1
+),
+
+-- Un solo recorrido de cuotas vencidas (status 4) para gastos, conteo y primera fecha.
+AmortVencida AS (
+    SELECT
+        contract_id,
+        SUM(
+            COALESCE(interest_payment,0) +
+            COALESCE(endorsement,0) +
+            COALESCE(vat,0) +
+            COALESCE(seguro_vida,0) +
+            COALESCE(seguro,0) +
+            COALESCE(digital_sign,0) +
+            COALESCE(digital_sign_iva,0)
+        ) AS gastos_vencidos,
+        COUNT(*) AS cuotas_atrasadas,
+        MIN(expiration_date) AS min_expiration_date
+    FROM contract_amortization
+    WHERE contract_id IN (SELECT id FROM _ids)
+      AND contract_amortization_payment_status_id = 4
+    GROUP BY contract_id
+),
+
+DiasInicialesCalculadosPhone AS (
+    SELECT
+        c.id AS contract_id,
+        COALESCE(
+            GREATEST(
+                (
+                    date_trunc('month', CURRENT_DATE)::date
+                    - av.min_expiration_date::date
+                ),
+                0
+            ),
+            0
+        )::int AS Dias_iniciales_Mes
+    FROM contract c
+    LEFT JOIN AmortVencida av ON av.contract_id = c.id
+    WHERE c.id IN (SELECT id FROM _ids)
+),
+
+CuotasPagadas AS (
+    SELECT contract_id,
+           COUNT(*) AS cantidad_cuotas_pagados
+    FROM contract_amortization
+    WHERE contract_id IN (SELECT id FROM _ids)
+      AND contract_amortization_payment_status_id IN (1,5)
+    GROUP BY contract_id
+),
+
+CapitalPendiente AS (
+    SELECT
+        c.id AS contract_id,
+        COALESCE(
+            ucp.capital_ultima_pagada::numeric,
+            (
+                al.device_price::numeric
+                - al.initial_pay::numeric
+                + COALESCE(acc.total_precio_accesorios,0::numeric)
+            )
+        ) AS capital_pendiente,
+        al.quota::numeric AS quota
+    FROM contract c
+    LEFT JOIN application a ON a.id = c.application_id
+    LEFT JOIN AccesoriosPhone acc ON a.id = acc.application_id
+    LEFT JOIN application_loan al 
+           ON al.application_id = a.id
+          AND al.id = acc.max_loan_id
+    LEFT JOIN UltimaCuotaPagadaPhone ucp ON c.id = ucp.contract_id
+    WHERE c.id IN (SELECT id FROM _ids)
+),
+
+DeudaActual AS (
+    SELECT
+        cp.contract_id,
+        cp.capital_pendiente,
+        cp.quota,
+        COALESCE(g.gastos_vencidos::numeric, 0::numeric) AS gastos_vencidos,
+        cp.capital_pendiente + COALESCE(g.gastos_vencidos::numeric, 0::numeric) AS deuda_actual
+    FROM CapitalPendiente cp
+    LEFT JOIN AmortVencida g ON g.contract_id = cp.contract_id
+)
+
+SELECT 
+    CONCAT('PHONE', c.id) AS Llave,
+    'PHONE' AS Producto,
+    c.id AS Contrato_x,
+    concat_ws(' ', c2.name, c2.name2, c2.last_name, c2.last_name2) AS cliente,
+    c2.phone AS telefono,
+    c2.email AS correo,
+    c2.dni AS cedula,
+    c2.departament_reference AS ciudad,
+    da.capital_pendiente,
+    da.gastos_vencidos,
+    da.deuda_actual,
+    dsc.Dias_iniciales_Mes,
+    -- Descuentos y opciones de pago se calculan en _calcular_opciones_pago.
+    da.quota,
+
+    COALESCE(ca.cuotas_atrasadas, 0) AS "Cuotas Atrasadas",
+
+    CASE
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 1 AND 30 THEN '4%'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 31 AND 60 THEN '4%'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 61 AND 90 THEN '6%'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 91 AND 150 THEN '8%'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 210 THEN '11%'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 211 THEN '13%'
+        WHEN dsc.Dias_iniciales_Mes >= 212 THEN '15%'
+        ELSE '0%'
+    END AS Comision,
+
+    CASE
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 1 AND 30 THEN '1_30'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 31 AND 60 THEN '31_60'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 61 AND 90 THEN '61_90'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 91 AND 150 THEN '91_150'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 210 THEN '151_210'
+        WHEN dsc.Dias_iniciales_Mes BETWEEN 211 AND 211 THEN '211'
+        WHEN dsc.Dias_iniciales_Mes >= 212 THEN 'Cartera Castigada'
+        ELSE '0'
+    END AS Rango,
+    
+    'Pagar_1_cuota__para_normalizar' AS Descripcion_opcion_1,
+    'Pagar_de_1_a_3_cuotas' AS Descripcion_opcion_2,
+    'descuento_1_cta_100%_2ctas<=$600k__3ctas>$600k' AS Descripcion_opcion_3,
+    'cap_pendiente_1_cta_100%_2ctas<=$600k__3ctas>$600k' AS Descripcion_opcion_4
+
+FROM contract c
+LEFT JOIN application a ON a.id = c.application_id
+LEFT JOIN customer c2 ON c2.id = a.customer_id
+LEFT JOIN DeudaActual da ON da.contract_id = c.id
+LEFT JOIN DiasInicialesCalculadosPhone dsc ON dsc.contract_id = c.id
+LEFT JOIN AmortVencida ca ON ca.contract_id = c.id
+LEFT JOIN CuotasPagadas cp ON cp.contract_id = c.id
+WHERE c.id IN (SELECT id FROM _ids)
+ORDER BY c.id ASC;
+"""
+
 
 class CollectionAgencyReportService:
     """Servicio para generar informes de casa de cobranza"""
@@ -22,6 +356,7 @@ class CollectionAgencyReportService:
     def __init__(self, postgres_session: Session, mysql_session: Session):
         self.postgres_session = postgres_session
         self.mysql_session = mysql_session
+        self._mysql_lock = threading.Lock()
         
         # ConfiguraciÃ³n de bases de datos (exacta del script original)
         self.DB_CONFIG_PROD = {
@@ -52,47 +387,80 @@ class CollectionAgencyReportService:
         WHERE user_id = {user_id};
         """
 
-        conn_ind = psycopg2.connect(
-            host=self.DB_CONFIG_IND['host'],
-            user=self.DB_CONFIG_IND['user'],
-            password=self.DB_CONFIG_IND['password'],
-            dbname=self.DB_CONFIG_IND['database'],
-            port=self.DB_CONFIG_IND['port'],
-            options=self.DB_CONFIG_IND['options']
-        )
-
-        try:
+        with _pooled_connection(self.DB_CONFIG_IND) as conn_ind:
             df = pd.read_sql(query, conn_ind)
             return df["contract_id"].tolist() if not df.empty else []
-        finally:
-            conn_ind.close()
 
     def _get_assigned_contracts_for_house(self, user_ids: List[int]) -> List[int]:
         """Obtener TODOS los contratos asignados a cualquier usuario de la casa."""
         if not user_ids:
             return []
-        users_str = ",".join(str(int(uid)) for uid in user_ids)
+        users_str = ",".join(map(str, map(int, user_ids)))
         query = f"""
         SELECT DISTINCT contract_id
         FROM contract_advisors
         WHERE user_id IN ({users_str});
         """
 
-        conn_ind = psycopg2.connect(
-            host=self.DB_CONFIG_IND['host'],
-            user=self.DB_CONFIG_IND['user'],
-            password=self.DB_CONFIG_IND['password'],
-            dbname=self.DB_CONFIG_IND['database'],
-            port=self.DB_CONFIG_IND['port'],
-            options=self.DB_CONFIG_IND['options']
-        )
-
-        try:
+        with _pooled_connection(self.DB_CONFIG_IND) as conn_ind:
             df = pd.read_sql(query, conn_ind)
             return df["contract_id"].tolist() if not df.empty else []
-        finally:
-            conn_ind.close()
     
+    @staticmethod
+    def _iter_dataframes(
+        query: str,
+        db_config: Dict,
+        contract_ids: Optional[List[int]] = None,
+        chunksize: int = 50_000,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Ejecuta la consulta con un cursor de servidor psycopg2 y entrega el
+        resultado en DataFrames de a lo sumo chunksize filas (al menos uno,
+        vacio si no hay filas, para conservar las columnas).
+
+        Si se pasan contract_ids, se cargan una sola vez con COPY en la tabla
+        temporal _ids (con PK y ANALYZE) para que la consulta haga JOIN contra ella.
+        """
+        with _pooled_connection(db_config) as conn:
+            psycopg2.extensions.register_type(_NUMERIC_AS_FLOAT, conn)
+            params = None
+            if contract_ids is not None:
+                with conn.cursor() as cursor:
+                    try:
+                        cursor.execute(
+                            "CREATE TEMP TABLE _ids (id bigint PRIMARY KEY) ON COMMIT DROP"
+                        )
+                        cursor.copy_expert(
+                            "COPY _ids (id) FROM STDIN",
+                            io.StringIO("".join(f"{contract_id}\n" for contract_id in contract_ids)),
+                        )
+                        cursor.execute("ANALYZE _ids")
+                    except psycopg2.Error as temp_error:
+                        # Fallback sin privilegio TEMP (p. ej. replica de solo lectura):
+                        # el arreglo de ids viaja como parametro.
+                        logger.info(
+                            "No se pudo crear tabla temporal _ids (%s). Usando ANY(arreglo).",
+                            temp_error,
+                        )
+                        conn.rollback()
+                        query = query.replace("%", "%%").replace(
+                            "(SELECT id FROM _ids)",
+                            "(SELECT unnest(%(ids)s::bigint[]))",
+                        )
+                        params = {"ids": list(contract_ids)}
+
+            # DECLARE ... CURSOR no admite el ';' final de la consulta.
+            with conn.cursor(name="informe_casa_cobranza") as cursor:
+                cursor.execute(query.rstrip().rstrip(";"), params)
+                rows = cursor.fetchmany(chunksize)
+                columns = [column.name for column in cursor.description]
+                yield pd.DataFrame.from_records(rows, columns=columns)
+                while len(rows) == chunksize:
+                    rows = cursor.fetchmany(chunksize)
+                    if rows:
+                        yield pd.DataFrame.from_records(rows, columns=columns)
+            conn.rollback()
+
     def _fetch_missing_from_mysql(
         self, missing_ids: List[int], target_columns: List[str],
     ) -> Optional[pd.DataFrame]:
@@ -108,7 +476,7 @@ class CollectionAgencyReportService:
 
             for i in range(0, len(missing_ids), batch_size):
                 batch = missing_ids[i : i + batch_size]
-                batch_str = ",".join(str(int(cid)) for cid in batch)
+                batch_str = ",".join(map(str, map(int, batch)))
 
                 query = text(f"""
                     SELECT
@@ -155,9 +523,9 @@ class CollectionAgencyReportService:
                              cu.phone, cu.email, cu.dni, cu.departament_reference
                 """)
 
-                result = self.mysql_session.execute(query)
-                for row in result:
-                    all_rows.append(row)
+                # La sesion MySQL es compartida entre los hilos de generate_reports.
+                with self._mysql_lock:
+                    all_rows.extend(self.mysql_session.execute(query).all())
 
             if not all_rows:
                 return None
@@ -312,283 +680,113 @@ class CollectionAgencyReportService:
             logger.warning("No se pudo consultar MySQL para contratos faltantes: %s", error)
             return None
 
-    def _generar_query(self, lista_contratos: str) -> str:
-        """Generar query SQL para el informe (exacta del script original)"""
-        return f"""
-WITH 
-PagosCombinadosPhone AS (
-    SELECT contract_id AS Contrato,
-           to_char(created_at::date, 'YYYY-MM-DD') AS FechaConvertida,
-           amount AS Monto
-    FROM payment_bancocolombia_confirmation
-    WHERE contract_id IN ({lista_contratos})
-      AND (origin IS NULL OR origin = '' OR origin = 'PHONE')
-
-    UNION ALL
-
-    SELECT id_reference AS Contrato,
-           to_char(created_at::date, 'YYYY-MM-DD') AS FechaConvertida,
-           amount
-    FROM efecty_payment_confirmation
-    WHERE id_reference IN ({lista_contratos})
-      AND (origin IS NULL OR origin = '' OR origin = 'PHONE')
-
-    UNION ALL
-
-    SELECT id_reference AS Contrato,
-           to_char(created_at::date, 'YYYY-MM-DD') AS FechaConvertida,
-           amount
-    FROM pse_payment_confirmation
-    WHERE id_reference IN ({lista_contratos})
-      AND (origin IS NULL OR origin = '' OR origin = 'PHONE')
-
-    UNION ALL
-
-    SELECT id_reference AS Contrato,
-           to_char(created_at::date, 'YYYY-MM-DD') AS FechaConvertida,
-           amount
-    FROM puntored_payment_confirmation
-    WHERE id_reference IN ({lista_contratos})
-      AND (origin IS NULL OR origin = '' OR origin = 'PHONE')
-),
-
-AccesoriosPhone AS (
-    SELECT
-        al.application_id, 
-        MAX(al.id) AS max_loan_id,
-        COALESCE((
-            SELECT SUM(aa.price::numeric)
-            FROM application_accessory aa
-            WHERE aa.application_id = al.application_id
-        ), 0::numeric) AS total_precio_accesorios
-    FROM application_loan al
-    GROUP BY al.application_id
-),
-
-UltimaCuotaPagadaPhone AS (
-    SELECT contract_id,
-           outstanding_principal AS capital_ultima_pagada
-    FROM (
-        SELECT
-            ca.*,
-            ROW_NUMBER() OVER (PARTITION BY ca.contract_id ORDER BY ca.period_number DESC) AS rn
-        FROM contract_amortization ca
-        WHERE ca.contract_id IN ({lista_contratos})
-          AND ca.contract_amortization_payment_status_id IN (1,5)
-    ) x
-    WHERE rn = 1
-),
-
-DiasInicialesCalculadosPhone AS (
-    SELECT
-        c.id AS contract_id,
-        COALESCE(
-            GREATEST(
-                (
-                    date_trunc('month', CURRENT_DATE)::date
-                    - MIN(ca.expiration_date)::date
-                ),
-                0
-            ),
-            0
-        )::int AS Dias_iniciales_Mes
-    FROM contract c
-    LEFT JOIN contract_amortization ca 
-           ON ca.contract_id = c.id
-          AND ca.contract_amortization_payment_status_id = 4
-    WHERE c.id IN ({lista_contratos})
-    GROUP BY c.id
-),
-
-Gastos AS (
-    SELECT
-        contract_id,
-        SUM(
-            COALESCE(interest_payment,0) +
-            COALESCE(endorsement,0) +
-            COALESCE(vat,0) +
-            COALESCE(seguro_vida,0) +
-            COALESCE(seguro,0) +
-            COALESCE(digital_sign,0) +
-            COALESCE(digital_sign_iva,0)
-        ) AS gastos_vencidos
-    FROM contract_amortization
-    WHERE contract_id IN ({lista_contratos})
-      AND contract_amortization_payment_status_id = 4
-    GROUP BY contract_id
-),
-
-CuotasAtrasadas AS (
-    SELECT contract_id,
-           COUNT(*) AS cuotas_atrasadas
-    FROM contract_amortization
-    WHERE contract_id IN ({lista_contratos})
-      AND contract_amortization_payment_status_id = 4
-    GROUP BY contract_id
-),
-
-CuotasPagadas AS (
-    SELECT contract_id,
-           COUNT(*) AS cantidad_cuotas_pagados
-    FROM contract_amortization
-    WHERE contract_id IN ({lista_contratos})
-      AND contract_amortization_payment_status_id IN (1,5)
-    GROUP BY contract_id
-),
-
-CapitalPendiente AS (
-    SELECT
-        c.id AS contract_id,
-        COALESCE(
-            ucp.capital_ultima_pagada::numeric,
-            (
-                al.device_price::numeric
-                - al.initial_pay::numeric
-                + COALESCE(acc.total_precio_accesorios,0::numeric)
-            )
-        ) AS capital_pendiente,
-        al.quota::numeric AS quota
-    FROM contract c
-    LEFT JOIN application a ON a.id = c.application_id
-    LEFT JOIN AccesoriosPhone acc ON a.id = acc.application_id
-    LEFT JOIN application_loan al 
-           ON al.application_id = a.id
-          AND al.id = acc.max_loan_id
-    LEFT JOIN UltimaCuotaPagadaPhone ucp ON c.id = ucp.contract_id
-    WHERE c.id IN ({lista_contratos})
-),
-
-DeudaActual AS (
-    SELECT
-        cp.contract_id,
-        cp.capital_pendiente,
-        cp.quota,
-        COALESCE(g.gastos_vencidos::numeric, 0::numeric) AS gastos_vencidos,
-        cp.capital_pendiente + COALESCE(g.gastos_vencidos::numeric, 0::numeric) AS deuda_actual
-    FROM CapitalPendiente cp
-    LEFT JOIN Gastos g ON g.contract_id = cp.contract_id
-),
-
-Descuentos AS (
-    SELECT
-        dic.contract_id,
-        dic.Dias_iniciales_Mes,
-        CASE 
-            WHEN dic.Dias_iniciales_Mes IS NULL THEN 1::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 0 AND 150 THEN 1::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 151 AND 180 THEN 0.95::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 181 AND 300 THEN 0.90::numeric
-            ELSE 0.75::numeric
-        END AS factor_capital,
-        CASE 
-            WHEN dic.Dias_iniciales_Mes IS NULL THEN 0.70::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 0 AND 90 THEN 0.70::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 91 AND 120 THEN 0.60::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 121 AND 150 THEN 0.50::numeric
-            WHEN dic.Dias_iniciales_Mes BETWEEN 151 AND 365 THEN 0.40::numeric
-            ELSE 0::numeric
-        END AS factor_gastos
-    FROM DiasInicialesCalculadosPhone dic
-),
-
-ValorFinalDescuento AS (
-    SELECT
-        da.contract_id,
-        ROUND((
-            da.capital_pendiente * d.factor_capital +
-            COALESCE(da.gastos_vencidos,0::numeric) * d.factor_gastos
-        )::numeric, 0) AS valor_final_descuento
-    FROM DeudaActual da
-    LEFT JOIN Descuentos d ON d.contract_id = da.contract_id
-),
-
-OpcionesPago AS (
-    SELECT
-        da.contract_id,
-        da.quota AS valor_opcion_1,
-        da.deuda_actual AS valor_1_cuota_opcion_2,
-        ROUND((da.deuda_actual / 2)::numeric, 0) AS valor_2_cuotas_opcion_2,
-        CASE WHEN da.deuda_actual > 600000 THEN ROUND((da.deuda_actual / 3)::numeric, 0) END AS valor_3_cuotas_opcion_2,
-        vfd.valor_final_descuento AS valor_1_cuota_opcion_3,
-        ROUND((vfd.valor_final_descuento / 2)::numeric, 0) AS valor_2_cuotas_opcion_3,
-        CASE WHEN vfd.valor_final_descuento > 600000 THEN ROUND((vfd.valor_final_descuento / 3)::numeric, 0) END AS valor_3_cuotas_opcion_3,
-        da.capital_pendiente AS valor_1_cuota_opcion_4,
-        ROUND((da.capital_pendiente / 2)::numeric, 0) AS valor_2_cuotas_opcion_4,
-        CASE WHEN da.capital_pendiente > 600000 THEN ROUND((da.capital_pendiente / 3)::numeric, 0) END AS valor_3_cuotas_opcion_4
-    FROM DeudaActual da
-    LEFT JOIN ValorFinalDescuento vfd ON vfd.contract_id = da.contract_id
-)
-
-SELECT 
-    CONCAT('PHONE', c.id) AS Llave,
-    'PHONE' AS Producto,
-    c.id AS Contrato_x,
-    concat_ws(' ', c2.name, c2.name2, c2.last_name, c2.last_name2) AS cliente,
-    c2.phone AS telefono,
-    c2.email AS correo,
-    c2.dni AS cedula,
-    c2.departament_reference AS ciudad,
-    da.capital_pendiente,
-    da.gastos_vencidos,
-    da.deuda_actual,
-    dsc.Dias_iniciales_Mes,
-    CONCAT(ROUND((dsc.factor_capital * 100)::numeric, 0), '%') AS "%_Pago_capital",
-    CONCAT(ROUND((dsc.factor_gastos * 100)::numeric, 0), '%') AS "%_Descuento_gastos",
-    vfd.valor_final_descuento,
-
-    op.valor_opcion_1,
-    op.valor_1_cuota_opcion_2,
-    op.valor_2_cuotas_opcion_2,
-    op.valor_3_cuotas_opcion_2,
-    op.valor_1_cuota_opcion_3,
-    op.valor_2_cuotas_opcion_3,
-    op.valor_3_cuotas_opcion_3,
-    op.valor_1_cuota_opcion_4,
-    op.valor_2_cuotas_opcion_4,
-    op.valor_3_cuotas_opcion_4,
-
-    COALESCE(ca.cuotas_atrasadas, 0) AS "Cuotas Atrasadas",
-
-    CASE
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 1 AND 30 THEN '4%'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 31 AND 60 THEN '4%'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 61 AND 90 THEN '6%'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 91 AND 150 THEN '8%'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 210 THEN '11%'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 211 THEN '13%'
-        WHEN dsc.Dias_iniciales_Mes >= 212 THEN '15%'
-        ELSE '0%'
-    END AS Comision,
-
-    CASE
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 1 AND 30 THEN '1_30'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 31 AND 60 THEN '31_60'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 61 AND 90 THEN '61_90'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 91 AND 150 THEN '91_150'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 151 AND 210 THEN '151_210'
-        WHEN dsc.Dias_iniciales_Mes BETWEEN 211 AND 211 THEN '211'
-        WHEN dsc.Dias_iniciales_Mes >= 212 THEN 'Cartera Castigada'
-        ELSE '0'
-    END AS Rango,
     
-    'Pagar_1_cuota__para_normalizar' AS Descripcion_opcion_1,
-    'Pagar_de_1_a_3_cuotas' AS Descripcion_opcion_2,
-    'descuento_1_cta_100%_2ctas<=$600k__3ctas>$600k' AS Descripcion_opcion_3,
-    'cap_pendiente_1_cta_100%_2ctas<=$600k__3ctas>$600k' AS Descripcion_opcion_4
+    @staticmethod
+    def _prepare_chunk(df: pd.DataFrame, comision_override: Optional[int]) -> pd.DataFrame:
+        """Aplica los ajustes finales de columnas a un bloque del informe."""
+        # Eliminar campos no deseados
+        df = df.drop(columns=['cantidad_cuotas_pagados', 'Marca'], errors='ignore')
+
+        # Cobyser: el campo Comision va en 30 para todos los registros
+        if comision_override is not None and 'Comision' in df.columns:
+            df['Comision'] = comision_override
+
+        # Agregar campo NIT al inicio
+        df.insert(0, 'NIT', '901546410-9')
+        return df
+
+    @staticmethod
+    @contextmanager
+    def _open_report_sink(file_path: str, output_format: str):
+        """
+        Abre el destino del informe y entrega una funcion que escribe cada bloque.
+
+        xlsx: los bloques se escriben a medida que llegan (startrow) en un solo
+        ExcelWriter. xlsxwriter serializa sin construir el arbol de objetos de
+        openpyxl; constant_memory no se usa porque pandas escribe por columnas
+        y perderia celdas.
+        parquet: los bloques se acumulan y se escriben con pyarrow (zstd) al
+        cerrar, para que el esquema se infiera sobre el resultado completo.
+        """
+        if output_format == "parquet":
+            frames: List[pd.DataFrame] = []
+            yield frames.append
+            pd.concat(frames, ignore_index=True).to_parquet(
+                file_path, engine="pyarrow", compression="zstd", index=False,
+            )
+            return
+
+        startrow = 0
+        with pd.ExcelWriter(
+            file_path,
+            engine="xlsxwriter",
+            engine_kwargs={"options": {"strings_to_urls": False}},
+        ) as writer:
+            def write(df: pd.DataFrame) -> None:
+                nonlocal startrow
+                header = startrow == 0
+                df.to_excel(writer, index=False, header=header, startrow=startrow)
+                startrow += len(df) + int(header)
+
+            yield write
+
+    @staticmethod
+    def _resolve_output_format() -> str:
+        """Formato de salida configurado (xlsx por defecto); parquet requiere pyarrow."""
+        output_format = str(settings.REPORTS_OUTPUT_FORMAT or "xlsx").strip().lower()
+        if output_format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            logger.warning("REPORTS_OUTPUT_FORMAT=parquet sin pyarrow instalado. Se genera xlsx.")
+            return "xlsx"
+        return "parquet" if output_format == "parquet" else "xlsx"
+
+    def _run_one(
+        self,
+        user_id: int,
+        label: str,
+        contracts: List[int],
+        file_name: str,
+        comision_override: Optional[int],
+    ) -> str:
+        """Genera el informe de una casa y retorna la ruta del archivo."""
+        logger.info(f"\nðŸ“Š Generando reporte para USER {user_id} - {label} ({len(contracts)} contratos)...")
+        output_format = self._resolve_output_format()
+        if output_format == "parquet":
+            file_name = f"{os.path.splitext(file_name)[0]}.parquet"
+        file_path = os.path.join(settings.REPORTS_DIR, file_name)
+        reported_ids = set()
+        target_columns: List[str] = []
+
+        # El resultado se procesa y escribe por bloques: solo un bloque del
+        # DataFrame vive en memoria a la vez (en xlsx).
+        with self._open_report_sink(file_path, output_format) as write:
+            for chunk in self._iter_dataframes(
+                _build_query_template(),
+                self.DB_CONFIG_PROD,
+                sorted({int(contract_id) for contract_id in contracts}),
+            ):
+                chunk = _calcular_opciones_pago(chunk)
+                target_columns = chunk.columns.tolist()
+                if 'contrato_x' in chunk.columns:
+                    reported_ids.update(chunk['contrato_x'].dropna().astype(int).tolist())
+                write(self._prepare_chunk(chunk, comision_override))
+
+            # Recuperar contratos faltantes desde MySQL
+            if 'contrato_x' in target_columns and len(reported_ids) < len(contracts):
+                missing_ids = [cid for cid in contracts if cid not in reported_ids]
+                if missing_ids:
+                    logger.warning(
+                        "%s: %d contratos no en PG produccion. Consultando MySQL.",
+                        label,
+                        len(missing_ids),
+                    )
+                    mysql_df = self._fetch_missing_from_mysql(missing_ids, target_columns)
+                    if mysql_df is not None and not mysql_df.empty:
+                        write(self._prepare_chunk(mysql_df, comision_override))
+                        logger.info("%s: %d contratos recuperados desde MySQL.", label, len(mysql_df))
+
+        logger.info(f"âœ… INFORME USER {user_id} ({label}) GENERADO: {file_name}")
+        return file_path
 
-FROM contract c
-LEFT JOIN application a ON a.id = c.application_id
-LEFT JOIN customer c2 ON c2.id = a.customer_id
-LEFT JOIN DeudaActual da ON da.contract_id = c.id
-LEFT JOIN Descuentos dsc ON dsc.contract_id = c.id
-LEFT JOIN ValorFinalDescuento vfd ON vfd.contract_id = c.id
-LEFT JOIN OpcionesPago op ON op.contract_id = c.id
-LEFT JOIN CuotasAtrasadas ca ON ca.contract_id = c.id
-LEFT JOIN CuotasPagadas cp ON cp.contract_id = c.id
-WHERE c.id IN ({lista_contratos})
-ORDER BY c.id ASC;
-"""
-    
     def generate_reports(self) -> Dict[str, str]:
         """
         Genera informes de casa de cobranza para usuarios 81 (SERLEFIN) y 45 (COBYSER)
@@ -626,113 +824,31 @@ ORDER BY c.id ASC;
         fecha_actual = datetime.now().strftime('%d-%m-%y')
         reports_dir = settings.REPORTS_DIR
         os.makedirs(reports_dir, exist_ok=True)
-        
-        # GENERAR INFORME USER 81 (SERLEFIN)
-        if contracts_81:
-            logger.info(f"\nðŸ“Š Generando reporte para USER 81 - SERLEFIN ({len(contracts_81)} contratos)...")
-            lista_contratos_81 = ",".join(str(x) for x in contracts_81)
-            
-            conn_prod = psycopg2.connect(
-                host=self.DB_CONFIG_PROD['host'],
-                user=self.DB_CONFIG_PROD['user'],
-                password=self.DB_CONFIG_PROD['password'],
-                dbname=self.DB_CONFIG_PROD['database'],
-                port=self.DB_CONFIG_PROD['port'],
-                options=self.DB_CONFIG_PROD['options']
-            )
-            
-            try:
-                query_81 = self._generar_query(lista_contratos_81)
-                df_81 = pd.read_sql(query_81, conn_prod)
-
-                # Recuperar contratos faltantes desde MySQL
-                if 'contrato_x' in df_81.columns and len(df_81) < len(contracts_81):
-                    reported_ids = set(df_81['contrato_x'].dropna().astype(int).values)
-                    missing_ids = [cid for cid in contracts_81 if cid not in reported_ids]
-                    if missing_ids:
-                        logger.warning(
-                            "SERLEFIN: %d contratos no en PG produccion. Consultando MySQL.",
-                            len(missing_ids),
-                        )
-                        mysql_df = self._fetch_missing_from_mysql(missing_ids, df_81.columns.tolist())
-                        if mysql_df is not None and not mysql_df.empty:
-                            df_81 = pd.concat([df_81, mysql_df], ignore_index=True)
-                            logger.info("SERLEFIN: %d contratos recuperados desde MySQL.", len(mysql_df))
-
-                # Eliminar campos no deseados
-                for col in ['cantidad_cuotas_pagados', 'Marca']:
-                    if col in df_81.columns:
-                        df_81 = df_81.drop(columns=[col])
-
-                # Agregar campo NIT al inicio
-                df_81.insert(0, 'NIT', '901546410-9')
-
-                # Guardar Excel
-                file_name_81 = f"AloCredit-Phone-{fecha_actual}  INFORME MARTES Y JUEVES.xlsx"
-                file_path_81 = os.path.join(reports_dir, file_name_81)
-                df_81.to_excel(file_path_81, index=False)
-                
-                result['serlefin_file'] = file_path_81
-                logger.info(f"âœ… INFORME USER 81 (SERLEFIN) GENERADO: {file_name_81}")
-                
-            finally:
-                conn_prod.close()
-        
-        # GENERAR INFORME USER 45 (COBYSER)
-        if contracts_45:
-            logger.info(f"\nðŸ“Š Generando reporte para USER 45 - COBYSER ({len(contracts_45)} contratos)...")
-            lista_contratos_45 = ",".join(str(x) for x in contracts_45)
-            
-            conn_prod = psycopg2.connect(
-                host=self.DB_CONFIG_PROD['host'],
-                user=self.DB_CONFIG_PROD['user'],
-                password=self.DB_CONFIG_PROD['password'],
-                dbname=self.DB_CONFIG_PROD['database'],
-                port=self.DB_CONFIG_PROD['port'],
-                options=self.DB_CONFIG_PROD['options']
-            )
-            
-            try:
-                query_45 = self._generar_query(lista_contratos_45)
-                df_45 = pd.read_sql(query_45, conn_prod)
-
-                # Recuperar contratos faltantes desde MySQL
-                if 'contrato_x' in df_45.columns and len(df_45) < len(contracts_45):
-                    reported_ids = set(df_45['contrato_x'].dropna().astype(int).values)
-                    missing_ids = [cid for cid in contracts_45 if cid not in reported_ids]
-                    if missing_ids:
-                        logger.warning(
-                            "COBYSER: %d contratos no en PG produccion. Consultando MySQL.",
-                            len(missing_ids),
-                        )
-                        mysql_df = self._fetch_missing_from_mysql(missing_ids, df_45.columns.tolist())
-                        if mysql_df is not None and not mysql_df.empty:
-                            df_45 = pd.concat([df_45, mysql_df], ignore_index=True)
-                            logger.info("COBYSER: %d contratos recuperados desde MySQL.", len(mysql_df))
-
-                # Eliminar campos no deseados
-                for col in ['cantidad_cuotas_pagados', 'Marca']:
-                    if col in df_45.columns:
-                        df_45 = df_45.drop(columns=[col])
-
-                # Cambiar el campo Comision a 30 en todos los registros
-                if 'Comision' in df_45.columns:
-                    df_45['Comision'] = 30
-
-                # Agregar campo NIT al inicio
-                df_45.insert(0, 'NIT', '901546410-9')
-
-                # Guardar Excel
-                file_name_45 = f"AloCredit-Phone-{fecha_actual}  INFORME MARTES Y JUEVES Cobyser.xlsx"
-                file_path_45 = os.path.join(reports_dir, file_name_45)
-                df_45.to_excel(file_path_45, index=False)
-                
-                result['cobyser_file'] = file_path_45
-                logger.info(f"âœ… INFORME USER 45 (COBYSER) GENERADO: {file_name_45}")
-                
-            finally:
-                conn_prod.close()
-        
+
+        # Ambos informes son independientes (cada uno abre su propia conexion):
+        # se generan en paralelo para solapar consultas y escritura de Excel.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future_81 = executor.submit(
+                self._run_one,
+                81,
+                "SERLEFIN",
+                contracts_81,
+                f"AloCredit-Phone-{fecha_actual}  INFORME MARTES Y JUEVES.xlsx",
+                None,
+            ) if contracts_81 else None
+            future_45 = executor.submit(
+                self._run_one,
+                45,
+                "COBYSER",
+                contracts_45,
+                f"AloCredit-Phone-{fecha_actual}  INFORME MARTES Y JUEVES Cobyser.xlsx",
+                30,
+            ) if contracts_45 else None
+
+            if future_81 is not None:
+                result['serlefin_file'] = future_81.result()
+            if future_45 is not None:
+                result['cobyser_file'] = future_45.result()
+
         logger.info("\nðŸ”¥ PROCESO COMPLETADO")
         return result
-
@@ -5,6 +5,7 @@ Obtiene contratos con atraso desde alocreditprod.
 import logging
 from typing import List, Dict, Set, Optional
 
+import numpy as np
 from sqlalchemy import bindparam, text
 from sqlalchemy.orm import Session
 
@@ -182,7 +183,7 @@ class ContractService:
         if filtered_ids:
             exclusion_clause = (
                 "  AND ca.contract_id NOT IN ("
-                + ",".join(str(contract_id) for contract_id in filtered_ids)
+                + ",".join(map(str, filtered_ids))
                 + ")\n"
             )
 
@@ -205,18 +206,16 @@ class ContractService:
         """
 
         try:
-            result = self.mysql_session.execute(text(query))
-            contracts = []
-
-            for row in result:
-                contracts.append(
-                    {
-                        "contract_id": row[0],
-                        "days_overdue": row[1],
-                        "total_debt": row[2],
-                        "status": row[3],
-                    }
-                )
+            rows = self.mysql_session.execute(text(query)).all()
+            contracts = [
+                {
+                    "contract_id": contract_id,
+                    "days_overdue": days_overdue,
+                    "total_debt": total_debt,
+                    "status": status,
+                }
+                for contract_id, days_overdue, total_debt, status in rows
+            ]
 
             logger.info(
                 f"Se encontraron {len(contracts)} contratos entre {min_days} y {max_days} dias de atraso"
@@ -227,9 +226,12 @@ class ContractService:
             logger.error(f"Error al consultar contratos: {e}")
             raise
 
-    def get_contracts_in_range(self, min_days: int, max_days: int) -> List[int]:
+    def get_contracts_in_range(self, min_days: int, max_days: int) -> np.ndarray:
         """
         Obtiene IDs de contratos con atraso en un rango especifico.
+
+        Returns:
+            Arreglo numpy int64 con los IDs de contrato
         """
         logger.info(
             f"Consultando contratos entre {min_days} y {max_days} dias de atraso..."
@@ -250,7 +252,7 @@ class ContractService:
 
         try:
             result = self.mysql_session.execute(text(query))
-            contract_ids = [row[0] for row in result]
+            contract_ids = np.fromiter(result.scalars(), dtype=np.int64)
 
             logger.info(
                 f"Se encontraron {len(contract_ids)} contratos entre {min_days} y {max_days} dias"
@@ -261,6 +263,30 @@ class ContractService:
             logger.error(f"Error al consultar contratos por rango: {e}")
             raise
 
+    def _load_temp_contract_ids(self, table_name: str, contract_ids: List[int]) -> None:
+        """
+        Crea (o vacia) una tabla temporal MEMORY con los contratos dados.
+
+        La tabla vive en la conexion de la sesion MySQL; lanza excepcion si no
+        hay privilegios DDL para que el llamador use su fallback IN por bloques.
+        """
+        self.mysql_session.execute(
+            text(
+                f"""
+                CREATE TEMPORARY TABLE IF NOT EXISTS {table_name} (
+                    contract_id BIGINT PRIMARY KEY
+                ) ENGINE=MEMORY
+                """
+            )
+        )
+        self.mysql_session.execute(text(f"TRUNCATE TABLE {table_name}"))
+
+        params = [{"contract_id": int(contract_id)} for contract_id in contract_ids]
+        insert_sql = text(f"INSERT IGNORE INTO {table_name} (contract_id) VALUES (:contract_id)")
+        batch_size = 5000
+        for i in range(0, len(params), batch_size):
+            self.mysql_session.execute(insert_sql, params[i : i + batch_size])
+
     def get_days_overdue_for_contracts(self, contract_ids: List[int]) -> Dict[int, int]:
         """
         Obtiene dias de atraso para un conjunto de contratos.
@@ -282,33 +308,64 @@ class ContractService:
             f"Consultando dias de atraso para {len(contract_ids)} contratos..."
         )
 
-        days_map: Dict[int, int] = {int(contract_id): 0 for contract_id in contract_ids}
+        days_map: Dict[int, int] = dict.fromkeys(map(int, contract_ids), 0)
 
         try:
-            batch_size = 1000
-            for i in range(0, len(contract_ids), batch_size):
-                batch = contract_ids[i : i + batch_size]
-                batch_ids = ",".join(str(int(contract_id)) for contract_id in batch)
-
-                query = f"""
-                SELECT
-                    ca.contract_id,
-                    DATEDIFF(CURDATE(), MIN(ca.expiration_date)) AS days_overdue
-                FROM contract_amortization ca
-                INNER JOIN contract c ON c.id = ca.contract_id
-                WHERE ca.contract_id IN ({batch_ids})
-                  AND ca.expiration_date <= CURDATE()
-                  AND ca.outstanding_principal > 0
-                  AND ca.contract_amortization_payment_status_id = 4
-                  AND c.contracts_status_id NOT IN (5, 7)
-                GROUP BY ca.contract_id
-                """
+            try:
+                # Estrategia preferida: una sola consulta con JOIN a tabla temporal.
+                self._load_temp_contract_ids("tmp_days_overdue_ids", contract_ids)
+                rows = self.mysql_session.execute(
+                    text(
+                        """
+                        SELECT
+                            ca.contract_id,
+                            COALESCE(DATEDIFF(CURDATE(), MIN(ca.expiration_date)), 0) AS days_overdue
+                        FROM contract_amortization ca
+                        INNER JOIN tmp_days_overdue_ids t
+                            ON t.contract_id = ca.contract_id
+                        INNER JOIN contract c ON c.id = ca.contract_id
+                        WHERE ca.expiration_date <= CURDATE()
+                          AND ca.outstanding_principal > 0
+                          AND ca.contract_amortization_payment_status_id = 4
+                          AND c.contracts_status_id NOT IN (5, 7)
+                        GROUP BY ca.contract_id
+                        """
+                    )
+                ).all()
+            except Exception as temp_error:
+                # Fallback sin privilegios DDL: consulta IN por bloques.
+                logger.info(
+                    "Sin privilegios para tabla temporal o fallo DDL (%s). "
+                    "Usando fallback IN por bloques.",
+                    temp_error,
+                )
+                statement = text(
+                    """
+                    SELECT
+                        ca.contract_id,
+                        COALESCE(DATEDIFF(CURDATE(), MIN(ca.expiration_date)), 0) AS days_overdue
+                    FROM contract_amortization ca
+                    INNER JOIN contract c ON c.id = ca.contract_id
+                    WHERE ca.contract_id IN :contract_ids
+                      AND ca.expiration_date <= CURDATE()
+                      AND ca.outstanding_principal > 0
+                      AND ca.contract_amortization_payment_status_id = 4
+                      AND c.contracts_status_id NOT IN (5, 7)
+                    GROUP BY ca.contract_id
+                    """
+                ).bindparams(bindparam("contract_ids", expanding=True))
+                rows = []
+                batch_size = 1000
+                for i in range(0, len(contract_ids), batch_size):
+                    batch = [int(contract_id) for contract_id in contract_ids[i : i + batch_size]]
+                    rows.extend(
+                        self.mysql_session.execute(statement, {"contract_ids": batch}).all()
+                    )
 
-                result = self.mysql_session.execute(text(query))
-                for row in result:
-                    contract_id = int(row[0])
-                    days_overdue = int(row[1]) if row[1] is not None else 0
-                    days_map[contract_id] = days_overdue
+            if rows:
+                # La consulta ya entrega 0 en lugar de NULL: ambas columnas son enteras.
+                days_array = np.asarray(rows, dtype=np.int64)
+                days_map.update(zip(days_array[:, 0].tolist(), days_array[:, 1].tolist()))
 
             logger.info(
                 f"Dias de atraso obtenidos para {len(days_map)} contratos"
@@ -343,7 +400,7 @@ class ContractService:
             batch_size = 1000
             for i in range(0, len(contract_ids), batch_size):
                 batch = contract_ids[i : i + batch_size]
-                batch_ids = ",".join(str(int(contract_id)) for contract_id in batch)
+                batch_ids = ",".join(map(str, map(int, batch)))
 
                 query = f"""
                 SELECT
@@ -401,29 +458,7 @@ class ContractService:
         try:
             try:
                 # Estrategia preferida: tabla temporal + JOIN.
-                self.mysql_session.execute(
-                    text(
-                        """
-                        CREATE TEMPORARY TABLE IF NOT EXISTS tmp_contract_state_sync (
-                            contract_id BIGINT PRIMARY KEY
-                        ) ENGINE=MEMORY
-                        """
-                    )
-                )
-                self.mysql_session.execute(text("TRUNCATE TABLE tmp_contract_state_sync"))
-
-                params = [{"contract_id": int(contract_id)} for contract_id in contract_ids]
-                batch_size = 5000
-                for i in range(0, len(params), batch_size):
-                    self.mysql_session.execute(
-                        text(
-                            """
-                            INSERT INTO tmp_contract_state_sync (contract_id)
-                            VALUES (:contract_id)
-                            """
-                        ),
-                        params[i : i + batch_size],
-                    )
+                self._load_temp_contract_ids("tmp_contract_state_sync", contract_ids)
 
                 result = self.mysql_session.execute(
                     text(
@@ -459,7 +494,7 @@ class ContractService:
                     batch = contract_ids[i : i + batch_size]
                     if not batch:
                         continue
-                    batch_ids = ",".join(str(int(contract_id)) for contract_id in batch)
+                    batch_ids = ",".join(map(str, map(int, batch)))
 
                     query = f"""
                     SELECT
@@ -4,15 +4,55 @@ Implementa la lógica de contratos fijos, limpieza y balanceo equitativo.
 Trabaja con contratos del día 1 al 60 de atraso.
 """
 import logging
-from typing import List, Dict, Set
+from operator import itemgetter
+from typing import List, Dict, Set, Tuple
+import numpy as np
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.database.bulk import delete_returning, insert_on_conflict_returning
 from app.database.models import ContractAdvisor, Management
 from app.services.contract_service import ContractService
 from app.services.history_service import HistoryService
 
 logger = logging.getLogger(__name__)
 
+def _division_user_ids() -> Tuple[int, ...]:
+    """Usuarios de división leídos de settings en cada llamada (tupla, en orden)."""
+    return tuple(settings.DIVISION_USER_IDS)
+
+
+def _balanced_positions(counts: np.ndarray, total: int) -> np.ndarray:
+    """
+    Posición de usuario (índice en counts) para cada uno de total contratos
+    ordenados, equivalente a asignar uno a uno al usuario con menos contratos
+    (empate: menor posición).
+
+    Cada usuario aporta "cupos" con nivel counts[u], counts[u] + 1, ...; el
+    k-ésimo contrato toma el k-ésimo cupo ordenado por (nivel, posición).
+    Solo hacen falta cupos por debajo del nivel final, donde todos alcanzan.
+    """
+    if total <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Nivel final: menor nivel con cupos suficientes por debajo de él.
+    low, high = int(counts.min()) + 1, int(counts.min()) + total
+    while low < high:
+        level = (low + high) // 2
+        if int(np.maximum(level - counts, 0).sum()) >= total:
+            high = level
+        else:
+            low = level + 1
+
+    slots_per_user = np.maximum(low - counts, 0)
+    slot_positions = np.repeat(np.arange(len(counts)), slots_per_user)
+    slot_starts = np.repeat(np.cumsum(slots_per_user) - slots_per_user, slots_per_user)
+    slot_levels = np.repeat(counts, slots_per_user) + (
+        np.arange(len(slot_positions)) - slot_starts
+    )
+    order = np.lexsort((slot_positions, slot_levels))[:total]
+    return slot_positions[order]
+
 
 class DivisionService:
     """
@@ -48,9 +88,17 @@ class DivisionService:
             blocked_documents
         )
 
+    def _finish(self, commit: bool) -> None:
+        """Confirma la transacción o solo hace flush si la controla el llamador."""
+        if commit:
+            self.postgres_session.commit()
+        else:
+            self.postgres_session.flush()
+
     def enforce_blacklist_on_active_assignments(
         self,
         blocked_contract_ids: Set[int],
+        commit: bool = True,
     ) -> Dict[str, int]:
         """Elimina asignaciones activas de contratos bloqueados y cierra historial."""
         stats = {
@@ -66,43 +114,51 @@ class DivisionService:
         if not blocked_ids:
             return stats
 
-        active_rows = self.postgres_session.query(
-            ContractAdvisor.user_id,
-            ContractAdvisor.contract_id,
-        ).filter(
-            ContractAdvisor.contract_id.in_(blocked_ids)
-        ).all()
-        if not active_rows:
-            return stats
+        try:
+            active_rows = delete_returning(
+                self.postgres_session,
+                ContractAdvisor,
+                ContractAdvisor.contract_id,
+                blocked_ids,
+                returning=[ContractAdvisor.user_id, ContractAdvisor.contract_id],
+            )
+            if not active_rows:
+                return stats
 
-        contracts_removed: Dict[int, List[int]] = {}
-        for user_id, contract_id in active_rows:
-            contracts_removed.setdefault(int(user_id), []).append(int(contract_id))
-        stats["blocked_found_active"] = len(active_rows)
+            contracts_removed: Dict[int, List[int]] = {}
+            for user_id, contract_id in active_rows:
+                contracts_removed.setdefault(int(user_id), []).append(int(contract_id))
+            stats["blocked_found_active"] = len(active_rows)
 
-        terminal_metadata = {
-            int(contract_id): {
-                "tipo": "BLACKLIST_CLIENTE",
-                "estado_actual": "BLOQUEADO_CEDULA",
+            terminal_metadata = {
+                int(contract_id): {
+                    "tipo": "BLACKLIST_CLIENTE",
+                    "estado_actual": "BLOQUEADO_CEDULA",
+                }
+                for _, contract_id in active_rows
             }
-            for _, contract_id in active_rows
-        }
-        history_stats = self.history_service.close_assignments(
-            contracts_removed,
-            terminal_metadata=terminal_metadata,
-        )
-        stats["history_closed"] = int(history_stats.get("total_closed", 0))
-
-        deleted_count = self.postgres_session.query(ContractAdvisor).filter(
-            ContractAdvisor.contract_id.in_(blocked_ids)
-        ).delete(synchronize_session=False)
-        self.postgres_session.commit()
-        stats["removed_from_contract_advisors"] = int(deleted_count or 0)
-        return stats
+            history_stats = self.history_service.close_assignments(
+                contracts_removed,
+                terminal_metadata=terminal_metadata,
+                commit=False,
+            )
+            stats["history_closed"] = int(history_stats.get("total_closed", 0))
+            self._finish(commit)
+            stats["removed_from_contract_advisors"] = len(active_rows)
+            return stats
+        except Exception as error:
+            if commit:
+                self.postgres_session.rollback()
+            logger.error(
+                "Error aplicando enforcement de lista negra (division): %s",
+                error,
+            )
+            raise
     
     def enforce_promises_on_active_assignments(
         self,
         promise_contract_ids: Set[int],
+        commit: bool = True,
     ) -> Dict[str, int]:
         """
         Remueve asignaciones activas de contratos con promesa activa y cierra historial.
@@ -125,12 +181,13 @@ class DivisionService:
             return stats
 
         try:
-            active_rows = self.postgres_session.query(
-                ContractAdvisor.user_id,
+            active_rows = delete_returning(
+                self.postgres_session,
+                ContractAdvisor,
                 ContractAdvisor.contract_id,
-            ).filter(
-                ContractAdvisor.contract_id.in_(promise_ids)
-            ).all()
+                promise_ids,
+                returning=[ContractAdvisor.user_id, ContractAdvisor.contract_id],
+            )
 
             if not active_rows:
                 return stats
@@ -151,14 +208,11 @@ class DivisionService:
             history_stats = self.history_service.close_assignments(
                 contracts_removed,
                 terminal_metadata=terminal_metadata,
+                commit=False,
             )
             stats["history_closed"] = int(history_stats.get("total_closed", 0))
-
-            deleted_count = self.postgres_session.query(ContractAdvisor).filter(
-                ContractAdvisor.contract_id.in_(promise_ids)
-            ).delete(synchronize_session=False)
-            self.postgres_session.commit()
-            stats["removed_from_contract_advisors"] = int(deleted_count or 0)
+            self._finish(commit)
+            stats["removed_from_contract_advisors"] = len(active_rows)
 
             logger.info(
                 "Enforcement promesas activas (division): encontrados=%s, "
@@ -169,7 +223,8 @@ class DivisionService:
             )
             return stats
         except Exception as error:
-            self.postgres_session.rollback()
+            if commit:
+                self.postgres_session.rollback()
             logger.error(
                 "Error aplicando enforcement de promesas activas (division): %s",
                 error,
@@ -184,11 +239,14 @@ class DivisionService:
         
         FILTRO 0 - effect='acuerdo_de_pago':
             - Mantener SOLO si promise_date >= HOY (la promesa NO ha pasado)
-            - Si promise_date < HOY → NO es fijo (marcar is_fixed=0)
+            - Si promise_date < HOY → NO es fijo (se descarta en la consulta)
         
         FILTRO 1 - effect='pago_total':
             - Mantener SOLO si management_date es de máximo 30 días
-            - Si han pasado más de 30 días → NO es fijo (marcar is_fixed=0)
+            - Si han pasado más de 30 días → NO es fijo (se descarta en la consulta)
+        
+        La columna managements.is_fixed no se actualiza aquí: las gestiones
+        vencidas solo quedan fuera del resultado.
         
         Los contratos que cumplen las condiciones se asignan según el usuario
         que tiene el registro en managements (usuarios 3, 4, 5, 6, 7, 8, 11, 12).
@@ -197,7 +255,9 @@ class DivisionService:
             Diccionario {user_id: set(contract_ids)} - Para los 8 usuarios
         """
         from datetime import datetime, timedelta
-        from sqlalchemy import or_
+        from sqlalchemy import and_, func, or_
+
+        division_user_ids = _division_user_ids()
         
         logger.info(
             "Consultando contratos fijos desde managements (PostgreSQL) "
@@ -209,117 +269,95 @@ class DivisionService:
         )
         
         # Inicializar diccionario para los 8 usuarios
-        fixed_contracts = {user_id: set() for user_id in settings.DIVISION_USER_IDS}
-        contracts_to_unfix = []
+        fixed_contracts = {user_id: set() for user_id in division_user_ids}
         
         try:
-            today = datetime.now().date()
-            logger.info(f"Fecha actual para filtros: {today} (tipo: {type(today).__name__})")
+            now = datetime.now()
+            today = now.date()
+            logger.info(
+                "Fecha actual para filtros: %s (tipo: %s)",
+                today,
+                type(today).__name__,
+            )
             
-            # Crear datetime naive para comparaciones
-            validity_datetime = datetime.now().replace(
-                hour=0, minute=0, second=0, microsecond=0, tzinfo=None
-            ) - timedelta(days=settings.PAGO_TOTAL_VALIDITY_DAYS)
-            logger.info(f"Fecha límite pago_total (hace 30 días): {validity_datetime.date()}")
+            # Rango de 1 mes para pago_total como intervalo semiabierto
+            # [hace 30 días 00:00, mañana 00:00): sin funciones sobre la columna,
+            # el índice de management_date se usa directamente.
+            validity_datetime = datetime.combine(
+                today - timedelta(days=settings.PAGO_TOTAL_VALIDITY_DAYS),
+                datetime.min.time(),
+            )
+            tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+            effect_acuerdo = settings.EFFECT_ACUERDO_PAGO
+            effect_pago = settings.EFFECT_PAGO_TOTAL
+            logger.info("Fecha límite pago_total (hace 30 días): %s", validity_datetime.date())
             
-            # Obtener TODOS los contratos con effect relevantes de los 8 usuarios
-            all_managements = self.postgres_session.query(Management).filter(
-                Management.user_id.in_(settings.DIVISION_USER_IDS),
-                or_(
-                    Management.effect == settings.EFFECT_ACUERDO_PAGO,
-                    Management.effect == settings.EFFECT_PAGO_TOTAL
-                )
-            ).all()
+            base_filter = and_(
+                Management.user_id.in_(division_user_ids),
+                Management.effect.in_(
+                    (effect_acuerdo, effect_pago)
+                ),
+            )
             
-            logger.info(
-                f"Registros encontrados en managements para división: "
-                f"{len(all_managements)}"
+            valid_filter = or_(
+                and_(
+                    Management.effect == effect_acuerdo,
+                    Management.promise_date >= today,
+                ),
+                and_(
+                    Management.effect == effect_pago,
+                    Management.management_date >= validity_datetime,
+                    Management.management_date < tomorrow,
+                ),
             )
             
-            # Procesar cada registro aplicando los filtros
-            stats = {
-                'acuerdo_pago_valid': 0,
-                'acuerdo_pago_expired': 0,
-                'pago_total_valid': 0,
-                'pago_total_expired': 0
+            # Totales y válidos por effect en un solo agregado: el recorrido de
+            # filas no necesita contar ni registrar nada por registro.
+            counts_by_effect = {
+                effect: (int(total), int(valid))
+                for effect, total, valid in self.postgres_session.execute(
+                    select(
+                        Management.effect,
+                        func.count(),
+                        func.count().filter(valid_filter),
+                    )
+                    .where(base_filter)
+                    .group_by(Management.effect)
+                ).all()
             }
+            acuerdo_total, acuerdo_valid = counts_by_effect.get(effect_acuerdo, (0, 0))
+            pago_total, pago_valid = counts_by_effect.get(effect_pago, (0, 0))
             
-            for record in all_managements:
-                is_valid = False
-                
-                # FILTRO 0: acuerdo_de_pago
-                if record.effect == settings.EFFECT_ACUERDO_PAGO:
-                    if record.promise_date and record.promise_date >= today:
-                        is_valid = True
-                        stats['acuerdo_pago_valid'] += 1
-                        logger.info(f"  ✓ Acuerdo VÁLIDO: contrato {record.contract_id}, user {record.user_id}, promise_date={record.promise_date} >= {today}")
-                    else:
-                        contracts_to_unfix.append(record.id)
-                        stats['acuerdo_pago_expired'] += 1
-                        if record.promise_date:
-                            logger.info(f"  ✗ Acuerdo EXPIRADO: contrato {record.contract_id}, user {record.user_id}, promise_date={record.promise_date} < {today}")
-                        else:
-                            logger.info(f"  ✗ Acuerdo SIN FECHA: contrato {record.contract_id}, user {record.user_id}, promise_date=None")
-                
-                # FILTRO 1: pago_total
-                elif record.effect == settings.EFFECT_PAGO_TOTAL:
-                    if record.management_date:
-                        # Convertir a naive si es aware para comparación
-                        mgmt_date = record.management_date
-                        if mgmt_date.tzinfo is not None:
-                            mgmt_date = mgmt_date.replace(tzinfo=None)
-                        
-                        # Rango de 1 mes: hace 30 días <= mgmt_date <= hoy
-                        hoy_naive = datetime.now().replace(hour=23, minute=59, second=59, microsecond=999999, tzinfo=None)
-                        if validity_datetime <= mgmt_date <= hoy_naive:
-                            is_valid = True
-                            stats['pago_total_valid'] += 1
-                            logger.info(f"  ✓ Pago VÁLIDO: contrato {record.contract_id}, user {record.user_id}, mgmt_date={mgmt_date.date()} en [{validity_datetime.date()}, {hoy_naive.date()}]")
-                        else:
-                            contracts_to_unfix.append(record.id)
-                            stats['pago_total_expired'] += 1
-                            logger.info(f"  ✗ Pago EXPIRADO: contrato {record.contract_id}, user {record.user_id}, mgmt_date={mgmt_date.date()} fuera [{validity_datetime.date()}, {hoy_naive.date()}]")
-                    else:
-                        contracts_to_unfix.append(record.id)
-                        stats['pago_total_expired'] += 1
-                        logger.info(f"  ✗ Pago SIN FECHA: contrato {record.contract_id}, user {record.user_id}, management_date=None")
-                
-                # Si es válido, asignar al usuario correspondiente
-                if is_valid and record.user_id in settings.DIVISION_USER_IDS:
-                    fixed_contracts[record.user_id].add(record.contract_id)
-            
-            logger.info(f"✓ Análisis de contratos fijos para división completado:")
-            logger.info("  Acuerdo de Pago:")
-            logger.info(
-                f"    - Válidos (promise_date >= hoy): "
-                f"{stats['acuerdo_pago_valid']}"
-            )
-            logger.info(
-                f"    - Expirados (promise_date < hoy): "
-                f"{stats['acuerdo_pago_expired']}"
-            )
-            logger.info("  Pago Total:")
-            logger.info(
-                f"    - Válidos (≤ 30 días): "
-                f"{stats['pago_total_valid']}"
+            # Los filtros de vigencia se aplican en la base: solo llegan filas válidas.
+            valid_rows = self.postgres_session.execute(
+                select(Management.user_id, Management.contract_id)
+                .where(base_filter, valid_filter)
+                .execution_options(yield_per=5000)
             )
+            for user_id, contract_id in valid_rows:
+                fixed_contracts[user_id].add(contract_id)
+            
+            counts_by_user = {
+                user_id: len(fixed_contracts[user_id])
+                for user_id in division_user_ids
+            }
             logger.info(
-                f"    - Expirados (> 30 días): "
-                f"{stats['pago_total_expired']}"
+                "✓ Contratos fijos para división: registros=%s | acuerdo_de_pago "
+                "válidos=%s expirados=%s | pago_total válidos=%s expirados=%s | "
+                "por usuario=%s | total=%s",
+                acuerdo_total + pago_total,
+                acuerdo_valid,
+                acuerdo_total - acuerdo_valid,
+                pago_valid,
+                pago_total - pago_valid,
+                counts_by_user,
+                sum(counts_by_user.values()),
             )
-            logger.info("")
-            logger.info("  Contratos fijos activos por usuario:")
-            total_fixed = 0
-            for user_id in settings.DIVISION_USER_IDS:
-                count = len(fixed_contracts[user_id])
-                total_fixed += count
-                logger.info(f"    - Usuario {user_id}: {count} contratos")
-            logger.info(f"    - Total: {total_fixed}")
             
             return fixed_contracts
         
         except Exception as e:
-            logger.error(f"✗ Error al consultar contratos fijos para división: {e}")
+            logger.error("✗ Error al consultar contratos fijos para división: %s", e)
             self.postgres_session.rollback()
             raise
     
@@ -330,27 +368,34 @@ class DivisionService:
         Returns:
             Diccionario {user_id: set(contract_ids)}
         """
+        division_user_ids = _division_user_ids()
         logger.info("Consultando asignaciones actuales para división...")
         
-        current_assignments = {user_id: set() for user_id in settings.DIVISION_USER_IDS}
+        current_assignments = {user_id: set() for user_id in division_user_ids}
         
         try:
-            assignments = self.postgres_session.query(ContractAdvisor).filter(
-                ContractAdvisor.user_id.in_(settings.DIVISION_USER_IDS)
-            ).all()
-            
-            for assignment in assignments:
-                if assignment.user_id in current_assignments:
-                    current_assignments[assignment.user_id].add(assignment.contract_id)
+            # Tuplas (user_id, contract_id) sin instanciar objetos ORM por fila.
+            rows = self.postgres_session.execute(
+                select(ContractAdvisor.user_id, ContractAdvisor.contract_id)
+                .where(ContractAdvisor.user_id.in_(division_user_ids))
+                .execution_options(yield_per=10_000)
+            )
+            for user_id, contract_id in rows:
+                current_assignments[user_id].add(contract_id)
             
-            logger.info(f"✓ Asignaciones actuales para división:")
-            for user_id in settings.DIVISION_USER_IDS:
-                logger.info(f"  - Usuario {user_id}: {len(current_assignments[user_id])} contratos")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("✓ Asignaciones actuales para división:")
+                for user_id in division_user_ids:
+                    logger.info(
+                        "  - Usuario %s: %s contratos",
+                        user_id,
+                        len(current_assignments[user_id]),
+                    )
             
             return current_assignments
         
         except Exception as e:
-            logger.error(f"✗ Error al consultar asignaciones actuales para división: {e}")
+            logger.error("✗ Error al consultar asignaciones actuales para división: %s", e)
             raise
     
     def get_contracts_for_division(
@@ -365,8 +410,9 @@ class DivisionService:
             Lista de diccionarios con contract_id y days_overdue
         """
         logger.info(
-            f"Consultando contratos con {settings.DIVISION_MIN_DAYS} a "
-            f"{settings.DIVISION_MAX_DAYS} días de atraso..."
+            "Consultando contratos con %s a %s días de atraso...",
+            settings.DIVISION_MIN_DAYS,
+            settings.DIVISION_MAX_DAYS,
         )
         
         try:
@@ -377,14 +423,12 @@ class DivisionService:
                 excluded_contract_ids=excluded_contract_ids,
             )
             
-            logger.info(
-                f"✓ Contratos encontrados para división: {len(contracts)}"
-            )
+            logger.info("✓ Contratos encontrados para división: %s", len(contracts))
             
             return contracts
         
         except Exception as e:
-            logger.error(f"✗ Error al consultar contratos para división: {e}")
+            logger.error("✗ Error al consultar contratos para división: %s", e)
             raise
     
     def balance_assignments(
@@ -413,76 +457,99 @@ class DivisionService:
         Returns:
             Tupla: (Diccionario {user_id: [contract_ids]}, Diccionario {contract_id: days_overdue})
         """
+        division_user_ids = _division_user_ids()
         logger.info(
-            f"Iniciando balanceo equitativo de contratos NUEVOS entre "
-            f"{len(settings.DIVISION_USER_IDS)} usuarios..."
+            "Iniciando balanceo equitativo de contratos NUEVOS entre %s usuarios...",
+            len(division_user_ids),
         )
         
-        new_assignments = {user_id: [] for user_id in settings.DIVISION_USER_IDS}
+        new_assignments = {user_id: [] for user_id in division_user_ids}
         contracts_days_map = {}
+
+        # Corrida idempotente: sin candidatos ni fijos no hay nada que balancear.
+        if not contracts_with_days and not any(
+            fixed_contracts.get(user_id) for user_id in division_user_ids
+        ):
+            logger.info("No hay contratos candidatos ni fijos para balancear")
+            return new_assignments, contracts_days_map
+        
+        # Arreglos paralelos (contrato, días) en lugar de la lista de diccionarios:
+        # el orden y los filtros se hacen sobre arreglos numpy.
+        total_candidates = len(contracts_with_days)
+        contract_ids = np.fromiter(
+            map(itemgetter('contract_id'), contracts_with_days),
+            dtype=np.int64,
+            count=total_candidates,
+        )
+        days_overdue = np.fromiter(
+            map(itemgetter('days_overdue'), contracts_with_days),
+            dtype=np.int32,
+            count=total_candidates,
+        )
+        contract_id_list = contract_ids.tolist()
         
         # Crear mapeo de días de atraso
-        for c in contracts_with_days:
-            contracts_days_map[c['contract_id']] = c['days_overdue']
+        contracts_days_map = dict(zip(contract_id_list, days_overdue.tolist()))
         
         # Crear set de contratos VÁLIDOS (solo los del rango 1-60 días)
-        valid_contract_ids = set(c['contract_id'] for c in contracts_with_days)
+        valid_contract_ids = set(contract_id_list)
         
         # Filtrar current_assignments para SOLO incluir contratos del rango válido (1-60 días)
         # Esto evita que contratos de OTROS rangos (0 días, 61-210 días, etc.) afecten el balance
         current_assignments_in_range = {}
-        for user_id in settings.DIVISION_USER_IDS:
+        for user_id in division_user_ids:
             current_assignments_in_range[user_id] = current_assignments[user_id] & valid_contract_ids
         
         # Obtener TODOS los contratos ya asignados EN EL RANGO (cualquier usuario)
-        all_currently_assigned = set()
-        for user_id in settings.DIVISION_USER_IDS:
-            all_currently_assigned.update(current_assignments_in_range[user_id])
+        all_currently_assigned = set().union(*current_assignments_in_range.values())
         
-        # Contar contratos fijos detectados automáticamente
-        total_fixed_auto = sum(len(fixed_contracts[uid]) for uid in settings.DIVISION_USER_IDS)
-        # Contar TODOS los contratos actuales EN EL RANGO (fijos automáticos + fijos manuales + otros)
-        total_currently_assigned = len(all_currently_assigned)
-        
-        logger.info(
-            f"Total contratos con {settings.DIVISION_MIN_DAYS}-"
-            f"{settings.DIVISION_MAX_DAYS} días: {len(contracts_with_days)}"
-        )
-        logger.info(
-            f"Contratos ya asignados EN EL RANGO 1-60 días (se mantienen): {total_currently_assigned}"
-        )
-        logger.info(
-            f"Contratos FIJOS automáticos detectados: {total_fixed_auto}"
-        )
-        logger.info("Desglose por usuario (SOLO contratos 1-60 días):")
-        for user_id in settings.DIVISION_USER_IDS:
-            fixed_auto = len(fixed_contracts[user_id])
-            current_in_range = len(current_assignments_in_range[user_id])
-            current_total_all_ranges = len(current_assignments[user_id])
+        # Resumen y desglose solo si INFO está habilitado: los conteos no se usan
+        # fuera de los logs.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "Total contratos con %s-%s días: %s",
+                settings.DIVISION_MIN_DAYS,
+                settings.DIVISION_MAX_DAYS,
+                total_candidates,
+            )
+            logger.info(
+                "Contratos ya asignados EN EL RANGO 1-60 días (se mantienen): %s",
+                len(all_currently_assigned),
+            )
             logger.info(
-                f"  Usuario {user_id}: {fixed_auto} auto-fijos, {current_in_range} en rango 1-60 días "
-                f"(+{current_total_all_ranges - current_in_range} fuera de rango)"
+                "Contratos FIJOS automáticos detectados: %s",
+                sum(len(fixed_contracts[uid]) for uid in division_user_ids),
             )
+            logger.info("Desglose por usuario (SOLO contratos 1-60 días):")
+            for user_id in division_user_ids:
+                current_in_range = len(current_assignments_in_range[user_id])
+                logger.info(
+                    "  Usuario %s: %s auto-fijos, %s en rango 1-60 días (+%s fuera de rango)",
+                    user_id,
+                    len(fixed_contracts[user_id]),
+                    current_in_range,
+                    len(current_assignments[user_id]) - current_in_range,
+                )
         
         # Paso 0: EXCLUIR contratos ya asignados Y contratos fijos
-        all_fixed_contracts = set()
-        for user_id in settings.DIVISION_USER_IDS:
-            all_fixed_contracts.update(fixed_contracts[user_id])
+        all_fixed_contracts = set().union(
+            *(fixed_contracts[user_id] for user_id in division_user_ids)
+        )
+        excluded = all_currently_assigned | all_fixed_contracts
         
         # Contratos NUEVOS = no asignados y no fijos existentes
-        contracts_new = [
-            c for c in contracts_with_days
-            if c['contract_id'] not in all_currently_assigned
-            and c['contract_id'] not in all_fixed_contracts
-        ]
+        excluded_ids = np.fromiter(excluded, dtype=np.int64, count=len(excluded))
+        new_mask = np.isin(contract_ids, excluded_ids, invert=True)
+        new_contract_ids = contract_ids[new_mask]
+        new_days_overdue = days_overdue[new_mask]
         
-        logger.info(
-            f"Contratos NUEVOS a balancear: {len(contracts_new)}"
-        )
+        logger.info("Contratos NUEVOS a balancear: %s", len(new_contract_ids))
         
         # Paso 1: Asignar contratos fijos que no estén asignados
         logger.info("Paso 1: Asignando contratos fijos no asignados...")
-        for user_id in settings.DIVISION_USER_IDS:
+        for user_id in division_user_ids:
+            if not fixed_contracts[user_id]:
+                continue
             fixed_not_assigned = (
                 fixed_contracts[user_id] - current_assignments_in_range[user_id]
             )
@@ -492,85 +559,97 @@ class DivisionService:
             
             if fixed_not_assigned:
                 logger.info(
-                    f"  Usuario {user_id}: {len(fixed_not_assigned)} "
-                    f"contratos fijos agregados"
+                    "  Usuario %s: %s contratos fijos agregados",
+                    user_id,
+                    len(fixed_not_assigned),
                 )
         
         # Paso 2: Dividir equitativamente contratos nuevos basado en balance actual
-        if contracts_new:
+        if len(new_contract_ids):
             logger.info(
-                f"Paso 2: Ordenando {len(contracts_new)} contratos NUEVOS "
-                f"por días de atraso y dividiendo equitativamente..."
+                "Paso 2: Ordenando %s contratos NUEVOS por días de atraso y "
+                "dividiendo equitativamente...",
+                len(new_contract_ids),
             )
             
-            # Ordenar por días de atraso descendente
-            sorted_contracts = sorted(
-                contracts_new,
-                key=lambda x: x['days_overdue'],
-                reverse=True
-            )
+            # Ordenar por días de atraso descendente (estable, como sorted(reverse=True))
+            order = np.argsort(-new_days_overdue, kind='stable')
+            sorted_contract_ids = new_contract_ids[order]
             
 # BALANCE EQUITATIVO: Calcular contratos EN RANGO 1-60 días por usuario
             # Incluye: SOLO contratos del rango 1-60 días + fijos que se van a asignar ahora
             # NO incluye contratos de otros rangos (0 días, 61-210 días, etc.)
             current_counts = {}
-            for user_id in settings.DIVISION_USER_IDS:
+            for user_id in division_user_ids:
                 # Contar SOLO contratos EN RANGO (manuales + automáticos) + fijos nuevos
                 current_counts[user_id] = (
                     len(current_assignments_in_range[user_id]) + 
                     len(new_assignments[user_id])
                 )
             
-            logger.info("  Balance actual por usuario (SOLO rango 1-60 días + fijos nuevos):")
-            for user_id in settings.DIVISION_USER_IDS:
-                fixed_auto = len(fixed_contracts[user_id])
-                current_in_range = len(current_assignments_in_range[user_id])
-                logger.info(
-                    f"    Usuario {user_id}: {current_counts[user_id]} totales en rango = "
-                    f"{current_in_range} actuales ({fixed_auto} auto-fijos) + {len(new_assignments[user_id])} fijos nuevos"
-                )
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("  Balance actual por usuario (SOLO rango 1-60 días + fijos nuevos):")
+                for user_id in division_user_ids:
+                    logger.info(
+                        "    Usuario %s: %s totales en rango = %s actuales "
+                        "(%s auto-fijos) + %s fijos nuevos",
+                        user_id,
+                        current_counts[user_id],
+                        len(current_assignments_in_range[user_id]),
+                        len(fixed_contracts[user_id]),
+                        len(new_assignments[user_id]),
+                    )
             
             # Asignar cada contrato al usuario que tiene MENOS contratos
             # Esto garantiza distribución equitativa (máximo 1 de diferencia)
-            for contract in sorted_contracts:
-                # Encontrar usuario con menor cantidad de contratos
-                min_user = min(current_counts.keys(), key=lambda u: current_counts[u])
-                
-                # Asignar contrato a ese usuario
-                new_assignments[min_user].append(contract['contract_id'])
-                
-                # Actualizar contador
-                current_counts[min_user] += 1
+            # El reparto se calcula de una vez (_balanced_positions) y cada usuario
+            # recibe su bloque con un solo extend, sin trabajo por contrato.
+            counts = np.fromiter(
+                (current_counts[user_id] for user_id in division_user_ids),
+                dtype=np.int64,
+                count=len(division_user_ids),
+            )
+            positions = _balanced_positions(counts, len(sorted_contract_ids))
+            grouped = sorted_contract_ids[np.argsort(positions, kind='stable')]
+            received = np.bincount(positions, minlength=len(counts))
+            for user_id, chunk in zip(
+                division_user_ids,
+                np.split(grouped, np.cumsum(received)[:-1]),
+            ):
+                new_assignments[user_id].extend(chunk.tolist())
+                current_counts[user_id] += len(chunk)
             
-            logger.info("  Balance FINAL por usuario (después de asignar nuevos):")
-            for user_id in settings.DIVISION_USER_IDS:
-                fixed_auto = len(fixed_contracts[user_id])
-                current_in_range = len(current_assignments_in_range[user_id])
-                nuevos = len(new_assignments[user_id])
-                logger.info(
-                    f"    Usuario {user_id}: {current_counts[user_id]} totales en rango 1-60 = "
-                    f"{current_in_range} actuales ({fixed_auto} auto-fijos) + {nuevos} nuevos"
-                )
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("  Balance FINAL por usuario (después de asignar nuevos):")
+                for user_id in division_user_ids:
+                    logger.info(
+                        "    Usuario %s: %s totales en rango 1-60 = %s actuales "
+                        "(%s auto-fijos) + %s nuevos",
+                        user_id,
+                        current_counts[user_id],
+                        len(current_assignments_in_range[user_id]),
+                        len(fixed_contracts[user_id]),
+                        len(new_assignments[user_id]),
+                    )
         else:
             logger.info(
                 "Paso 2: No hay contratos nuevos para balancear"
             )
         
         # Calcular estadísticas
-        logger.info(f"✓ Balanceo completado (SOLO contratos nuevos):")
-        total_nuevos = 0
-        for user_id in settings.DIVISION_USER_IDS:
-            count = len(new_assignments[user_id])
-            total_nuevos += count
-            porcentaje = (count / len(contracts_new) * 100) if contracts_new else 0
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✓ Balanceo completado (SOLO contratos nuevos):")
+            total_nuevos = 0
+            for user_id in division_user_ids:
+                count = len(new_assignments[user_id])
+                total_nuevos += count
+                porcentaje = (count / len(new_contract_ids) * 100) if len(new_contract_ids) else 0
+                logger.info("  - Usuario %s: %s contratos (%.1f%%)", user_id, count, porcentaje)
+            logger.info("  - Total nuevos asignados: %s contratos", total_nuevos)
             logger.info(
-                f"  - Usuario {user_id}: {count} contratos ({porcentaje:.1f}%)"
+                "  - Contratos previamente asignados (mantenidos): %s",
+                len(all_currently_assigned),
             )
-        logger.info(f"  - Total nuevos asignados: {total_nuevos} contratos")
-        logger.info(
-            f"  - Contratos previamente asignados (mantenidos): "
-            f"{len(all_currently_assigned)}"
-        )
         
         return new_assignments, contracts_days_map
     
@@ -578,25 +657,28 @@ class DivisionService:
         self,
         assignments: Dict[int, List[int]],
         excluded_contract_ids: Set[int] | None = None,
+        commit: bool = True,
     ) -> Dict[str, int]:
         """
         Guarda las nuevas asignaciones en la base de datos y en el historial.
         
-        OPTIMIZADO: Verifica duplicados en lote para mejor performance.
+        OPTIMIZADO: INSERT multi-fila con ON CONFLICT DO NOTHING (sin consulta previa).
         
         Args:
             assignments: Diccionario {user_id: [contract_ids]}
+            commit: Si es False, solo hace flush y el commit queda a cargo del llamador
         
         Returns:
             Estadísticas de inserción por usuario
         """
+        division_user_ids = _division_user_ids()
         logger.info("Guardando nuevas asignaciones de división...")
         
         stats = {
             'inserted_total': 0,
         }
         # Agregar stats por usuario
-        for user_id in settings.DIVISION_USER_IDS:
+        for user_id in division_user_ids:
             stats[f'inserted_user_{user_id}'] = 0
             
         new_assignments = {}  # Para registrar en historial
@@ -607,68 +689,69 @@ class DivisionService:
         }
         
         try:
-            # OPTIMIZACIÓN: Obtener TODOS los contratos ya asignados de una sola vez
-            all_contract_ids = set()
-            for contract_ids in assignments.values():
-                all_contract_ids.update(contract_ids)
-            all_contract_ids = {
-                int(contract_id)
-                for contract_id in all_contract_ids
+            rows = [
+                {"contract_id": int(contract_id), "user_id": int(user_id)}
+                for user_id, contract_ids in assignments.items()
+                for contract_id in contract_ids
                 if int(contract_id) not in blocked_ids
-            }
-            
-            logger.info(f"Verificando duplicados para {len(all_contract_ids)} contratos únicos...")
-            existing_assignments = self.postgres_session.query(
-                ContractAdvisor.contract_id
-            ).filter(
-                ContractAdvisor.contract_id.in_(all_contract_ids)
-            ).all()
-            
-            existing_contract_ids = set(row[0] for row in existing_assignments)
-            logger.info(f"Encontrados {len(existing_contract_ids)} contratos ya asignados en BD")
-            
-            # Insertar solo los que NO existen
-            for user_id, contract_ids in assignments.items():
+            ]
+
+            # INSERT multi-fila por lotes fijos; ON CONFLICT reemplaza la verificacion
+            # previa de duplicados y RETURNING indica lo realmente insertado.
+            logger.info("Insertando %s asignaciones de división (ON CONFLICT DO NOTHING)...", len(rows))
+            for user_id in assignments:
                 new_assignments[user_id] = []
-                
-                for contract_id in contract_ids:
-                    if int(contract_id) in blocked_ids:
-                        continue
-                    if contract_id not in existing_contract_ids:
-                        new_assignment = ContractAdvisor(
-                            contract_id=contract_id,
-                            user_id=user_id
-                        )
-                        self.postgres_session.add(new_assignment)
-                        new_assignments[user_id].append(contract_id)
-                        
-                        stats['inserted_total'] += 1
-                        stats[f'inserted_user_{user_id}'] += 1
-            
-            logger.info(f"Insertando {stats['inserted_total']} nuevas asignaciones de división...")
-            self.postgres_session.commit()
+
+            inserted_rows = insert_on_conflict_returning(
+                self.postgres_session,
+                ContractAdvisor,
+                rows,
+                conflict_columns=[ContractAdvisor.contract_id],
+                returning=[ContractAdvisor.contract_id, ContractAdvisor.user_id],
+            )
+            for contract_id, user_id in inserted_rows:
+                new_assignments.setdefault(user_id, []).append(contract_id)
+            stats['inserted_total'] = len(inserted_rows)
+            for user_id, contract_ids in new_assignments.items():
+                stats[f'inserted_user_{user_id}'] = len(contract_ids)
+
+            logger.info("Insertadas %s nuevas asignaciones de división", stats['inserted_total'])
+            self._finish(commit)
             
             # Registrar en historial con Fecha Inicial
             logger.info("Registrando asignaciones de división en historial...")
-            history_stats = self.history_service.register_assignments(new_assignments)
+            history_stats = self.history_service.register_assignments(
+                new_assignments,
+                commit=commit,
+            )
             
-            logger.info(f"✓ Asignaciones de división guardadas:")
-            logger.info(f"  - Total: {stats['inserted_total']}")
-            for user_id in settings.DIVISION_USER_IDS:
-                logger.info(f"  - Usuario {user_id}: {stats[f'inserted_user_{user_id}']} contratos")
-            logger.info(f"  - Historial registrado: {history_stats['total_registered']} registros")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("✓ Asignaciones de división guardadas:")
+                logger.info("  - Total: %s", stats['inserted_total'])
+                for user_id in division_user_ids:
+                    logger.info(
+                        "  - Usuario %s: %s contratos",
+                        user_id,
+                        stats[f'inserted_user_{user_id}'],
+                    )
+                logger.info(
+                    "  - Historial registrado: %s registros",
+                    history_stats['total_registered'],
+                )
             
             return stats
         
         except Exception as e:
-            logger.error(f"✗ Error al guardar asignaciones de división: {e}")
-            self.postgres_session.rollback()
+            logger.error("✗ Error al guardar asignaciones de división: %s", e)
+            if commit:
+                self.postgres_session.rollback()
             raise
     
     def ensure_fixed_contracts_assigned(
         self,
         fixed_contracts: Dict[int, Set[int]],
         excluded_contract_ids: Set[int] | None = None,
+        commit: bool = True,
     ) -> Dict[str, int]:
         """
         Asegura que TODOS los contratos fijos estén insertados en contract_advisors.
@@ -676,14 +759,16 @@ class DivisionService:
         
         Args:
             fixed_contracts: Diccionario {user_id: set(contract_ids)}
+            commit: Si es False, solo hace flush y el commit queda a cargo del llamador
         
         Returns:
             Estadísticas de contratos fijos insertados
         """
+        division_user_ids = _division_user_ids()
         logger.info("Verificando que todos los contratos fijos de división estén asignados...")
         
         stats = {'inserted_total': 0, 'already_assigned': 0}
-        for user_id in settings.DIVISION_USER_IDS:
+        for user_id in division_user_ids:
             stats[f'inserted_user_{user_id}'] = 0
             
         new_fixed_assignments = {}
@@ -694,67 +779,101 @@ class DivisionService:
         }
         
         try:
-            # Obtener TODOS los contratos ya asignados
-            all_assigned = self.postgres_session.query(ContractAdvisor.contract_id).all()
-            existing_contract_ids = set([row[0] for row in all_assigned])
-            
-            logger.info(f"Contratos ya asignados en sistema: {len(existing_contract_ids)}")
-            
-            # Para cada usuario de división, identificar contratos fijos NO asignados
-            for user_id in settings.DIVISION_USER_IDS:
-                user_fixed_contracts = {
+            # Unión de fijos por usuario construida una sola vez; los faltantes se
+            # calculan contra los ya asignados sin mutar nada dentro del bucle.
+            fixed_by_user = {
+                user_id: frozenset(
                     int(contract_id)
                     for contract_id in fixed_contracts.get(user_id, set())
                     if int(contract_id) not in blocked_ids
-                }
-                
-                if not user_fixed_contracts:
-                    continue
-                
-                # Identificar contratos fijos que NO existen en ninguna asignación
-                missing_fixed = user_fixed_contracts - existing_contract_ids
-                
-                if missing_fixed:
-                    logger.info(f"  Usuario {user_id}: {len(missing_fixed)} contratos fijos sin asignar")
-                    new_fixed_assignments[user_id] = list(missing_fixed)
-                    
-                    # Insertar contratos fijos faltantes
-                    for contract_id in missing_fixed:
-                        new_assignment = ContractAdvisor(
-                            user_id=user_id,
-                            contract_id=contract_id
+                )
+                for user_id in division_user_ids
+            }
+            fixed_union = frozenset().union(*fixed_by_user.values())
+
+            # Solo se consulta la existencia de los candidatos fijos, no toda la tabla.
+            existing_contract_ids = set()
+            if fixed_union:
+                existing_contract_ids = set(
+                    self.postgres_session.execute(
+                        select(ContractAdvisor.contract_id).where(
+                            ContractAdvisor.contract_id.in_(sorted(fixed_union))
                         )
-                        self.postgres_session.add(new_assignment)
-                        stats['inserted_total'] += 1
-                        stats[f'inserted_user_{user_id}'] += 1
-                        
-                        # Agregar a existing para evitar duplicados
-                        existing_contract_ids.add(contract_id)
-                else:
-                    already = user_fixed_contracts & existing_contract_ids
-                    stats['already_assigned'] += len(already)
+                    ).scalars()
+                )
+            logger.info("Contratos fijos ya asignados en sistema: %s", len(existing_contract_ids))
+
+            pending_missing = set(fixed_union)
+            pending_missing.difference_update(existing_contract_ids)
+            stats['already_assigned'] = len(fixed_union) - len(pending_missing)
+
+            rows = []
+            for user_id in division_user_ids:
+                # Un contrato fijo repetido entre usuarios queda con el primero.
+                missing_fixed = fixed_by_user[user_id] & pending_missing
+                if not missing_fixed:
+                    continue
+                pending_missing.difference_update(missing_fixed)
+
+                logger.info(
+                    "  Usuario %s: %s contratos fijos sin asignar",
+                    user_id,
+                    len(missing_fixed),
+                )
+                rows.extend(
+                    {"contract_id": contract_id, "user_id": user_id}
+                    for contract_id in sorted(missing_fixed)
+                )
+
+            # Insertar contratos fijos faltantes en lotes multi-fila; RETURNING
+            # deja fuera los que otra corrida haya insertado entretanto.
+            if rows:
+                inserted_rows = insert_on_conflict_returning(
+                    self.postgres_session,
+                    ContractAdvisor,
+                    rows,
+                    conflict_columns=[ContractAdvisor.contract_id],
+                    returning=[ContractAdvisor.contract_id, ContractAdvisor.user_id],
+                )
+                for contract_id, user_id in inserted_rows:
+                    new_fixed_assignments.setdefault(user_id, []).append(contract_id)
+                stats['inserted_total'] = len(inserted_rows)
+                for user_id, contract_ids in new_fixed_assignments.items():
+                    stats[f'inserted_user_{user_id}'] = len(contract_ids)
             
             if stats['inserted_total'] > 0:
-                self.postgres_session.commit()
+                self._finish(commit)
                 
                 # Registrar en historial
                 logger.info("Registrando contratos fijos de división en historial...")
-                history_stats = self.history_service.register_assignments(new_fixed_assignments)
+                history_stats = self.history_service.register_assignments(
+                    new_fixed_assignments,
+                    commit=commit,
+                )
                 
-                logger.info(f"✓ Contratos fijos de división insertados:")
-                logger.info(f"  - Total: {stats['inserted_total']}")
-                for user_id in settings.DIVISION_USER_IDS:
-                    if stats[f'inserted_user_{user_id}'] > 0:
-                        logger.info(f"  - Usuario {user_id}: {stats[f'inserted_user_{user_id}']} contratos")
-                logger.info(f"  - Historial: {history_stats['total_registered']} registros")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("✓ Contratos fijos de división insertados:")
+                    logger.info("  - Total: %s", stats['inserted_total'])
+                    for user_id in division_user_ids:
+                        if stats[f'inserted_user_{user_id}'] > 0:
+                            logger.info(
+                                "  - Usuario %s: %s contratos",
+                                user_id,
+                                stats[f'inserted_user_{user_id}'],
+                            )
+                    logger.info("  - Historial: %s registros", history_stats['total_registered'])
             else:
-                logger.info(f"✓ Todos los contratos fijos de división ya están asignados ({stats['already_assigned']} contratos)")
+                logger.info(
+                    "✓ Todos los contratos fijos de división ya están asignados (%s contratos)",
+                    stats['already_assigned'],
+                )
             
             return stats
         
         except Exception as e:
-            logger.error(f"✗ Error al asegurar contratos fijos de división: {e}")
-            self.postgres_session.rollback()
+            logger.error("✗ Error al asegurar contratos fijos de división: %s", e)
+            if commit:
+                self.postgres_session.rollback()
             raise
     
     def execute_division_process(self) -> Dict:
@@ -771,6 +890,10 @@ class DivisionService:
         5. Balancear SOLO contratos NUEVOS (no asignados) equitativamente
         6. Guardar asignaciones con historial
         
+        Todo corre en una sola transacción con un único commit al final. El
+        guardado va en un SAVEPOINT: si falla, solo se deshace esa fase y la
+        depuración previa (lista negra y promesas) queda confirmada.
+        
         Returns:
             Diccionario con resultados completos del proceso
         """
@@ -800,7 +923,10 @@ class DivisionService:
             results['blacklist_documents_count'] = len(blocked_documents)
             results['blacklist_contracts_count'] = len(blocked_contract_ids)
             results['blacklist_enforcement_stats'] = (
-                self.enforce_blacklist_on_active_assignments(blocked_contract_ids)
+                self.enforce_blacklist_on_active_assignments(
+                    blocked_contract_ids,
+                    commit=False,
+                )
             )
 
             # 1. Obtener contratos fijos (promesas activas) para excluirlos
@@ -827,12 +953,15 @@ class DivisionService:
 
             # Remover asignaciones activas de contratos con promesa activa
             results['promise_enforcement_stats'] = (
-                self.enforce_promises_on_active_assignments(promise_contract_ids)
+                self.enforce_promises_on_active_assignments(
+                    promise_contract_ids,
+                    commit=False,
+                )
             )
 
-            results['fixed_contracts'] = {
-                k: list(v) for k, v in fixed_contracts.items()
-            }
+            # Sets tal cual (sin copiar a listas): los consumidores solo cuentan y
+            # consultan pertenencia, y jsonable_encoder serializa sets si hace falta.
+            results['fixed_contracts'] = fixed_contracts
             results['promise_excluded_count'] = len(promise_contract_ids)
             results['fixed_inserted_stats'] = {
                 "skipped": "contratos con promesa activa no se asignan",
@@ -849,7 +978,7 @@ class DivisionService:
             contracts_with_arrears = self.get_contracts_for_division(
                 excluded_contract_ids=excluded_from_assignment,
             )
-            contract_ids = [c['contract_id'] for c in contracts_with_arrears]
+            contract_ids = list(map(itemgetter('contract_id'), contracts_with_arrears))
             results['contracts_to_assign'] = contract_ids
             
             # 5. Balanceo SOLO de contratos nuevos
@@ -863,17 +992,23 @@ class DivisionService:
             }
             results['contracts_days_map'] = contracts_days_map
             
-            # 6. Guardar asignaciones
-            insert_stats = self.save_assignments(
-                new_assignments,
-                excluded_contract_ids=blocked_contract_ids,
-            )
+            # 6. Guardar asignaciones dentro de un SAVEPOINT
+            try:
+                with self.postgres_session.begin_nested():
+                    insert_stats = self.save_assignments(
+                        new_assignments,
+                        excluded_contract_ids=blocked_contract_ids,
+                        commit=False,
+                    )
+            except Exception:
+                # El SAVEPOINT ya se deshizo: se conserva la depuración previa.
+                self.postgres_session.commit()
+                raise
+            self.postgres_session.commit()
             results['insert_stats'] = insert_stats
             
             # 7. Resultado final
-            results['final_assignments'] = {
-                k: v for k, v in new_assignments.items()
-            }
+            results['final_assignments'] = new_assignments
             results['success'] = True
             
             logger.info("=" * 80)
@@ -881,8 +1016,9 @@ class DivisionService:
             logger.info("=" * 80)
             
         except Exception as e:
-            logger.error(f"✗ Error en el proceso de división de contratos: {e}")
+            logger.error("✗ Error en el proceso de división de contratos: %s", e)
             results['error'] = str(e)
+            self.postgres_session.rollback()
             raise
         
         return results
@@ -1,19 +1,104 @@
 """
 Servicio para envio de correos electronicos con informes de asignacion.
 """
+import atexit
+import io
 import logging
 import smtplib
-from email import encoders
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from contextlib import contextmanager
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 from app.core.config import settings
 
+try:
+    # pybase64 (opcional) usa el codec SIMD; misma salida que base64.encodebytes.
+    from pybase64 import encodebytes as _encodebytes
+except ImportError:
+    from base64 import encodebytes as _encodebytes
+
 logger = logging.getLogger(__name__)
 
+# Bloque de lectura de adjuntos: 57 bytes por linea base64, 1024 lineas.
+_BASE64_READ_SIZE = 57 * 1024
+
+# Tope de conexiones SMTP simultaneas por envio en abanico (limite del relay).
+_MAX_SMTP_CONNECTIONS = 5
+
+# Corte de lote: con al menos 30 intentos y mas de 1/3 fallidos se aborta
+# (casi siempre es limitacion de tasa o credenciales del relay).
+_ABORT_MIN_ATTEMPTS = 30
+_ABORT_FAILURE_RATIO = 0.33
+
+# Pool de sesiones SMTP ya autenticadas, por (servidor, puerto, usuario).
+# Cada entrada es [sesion, creada_en (monotonic), mensajes_enviados]; una sesion
+# se reutiliza hasta 100 s desde que se abrio o 100 mensajes, lo que ocurra antes.
+_POOL_TTL_SECONDS = 100.0
+_POOL_MAX_MESSAGES = 100
+_POOL: Dict[Tuple[str, int, str], List[List[Any]]] = {}
+_POOL_LOCK = threading.Lock()
+
+
+def _close_pool() -> None:
+    """Cierra todas las sesiones SMTP en reposo del pool."""
+    with _POOL_LOCK:
+        entries = [entry for idle in _POOL.values() for entry in idle]
+        _POOL.clear()
+    for server, _created_at, _sent in entries:
+        EmailService._close_session(server)
+
+
+atexit.register(_close_pool)
+
+# Cuerpo HTML de send_multiple_reports: solo cambian metricas y textos de adjuntos.
+_MULTIPLE_REPORTS_BODY = Template("""
+        <html>
+        <head>
+            <style>
+                body { font-family: Arial, sans-serif; }
+                .header { background-color: #4CAF50; color: white; padding: 20px; text-align: center; }
+                .content { padding: 20px; }
+                .metrics { background-color: #f0f0f0; padding: 15px; margin: 20px 0; border-radius: 5px; }
+                .footer { text-align: center; padding: 20px; color: #777; font-size: 12px; }
+            </style>
+        </head>
+        <body>
+            <div class="header">
+                <h1>Informes de Asignacion de Cartera</h1>
+            </div>
+            <div class="content">
+                <p>Estimado/a,</p>
+                <p>Se comparte el resumen de asignacion de cartera para Serlefin y Cobyser.</p>
+
+                <div class="metrics">
+                    $metrics_html
+                </div>
+
+                <p><strong>Serlefin:</strong> ya puedes validar en tu plataforma segura la informacion.</p>
+
+                <p><strong>Archivos adjuntos:</strong></p>
+                <ul>
+                    <li>Serlefin (Usuario 81): $serlefin_text</li>
+                    <li>Cobyser (Usuario 45): $cobyser_text</li>
+                </ul>
+
+                <p>Los informes incluyen la columna <strong>Contrato Fijo</strong>.</p>
+            </div>
+            <div class="footer">
+                <p>Este es un correo automatico generado por el Sistema de Asignacion de Cartera AloCredit.</p>
+                <p>Por favor, no responder a este correo.</p>
+            </div>
+        </body>
+        </html>
+        """)
+
 
 class EmailService:
     """Servicio de envio de correos electronicos."""
@@ -27,13 +112,307 @@ class EmailService:
         self.email_from = settings.SMTP_FROM
 
         # Destinatarios de excepcion: Serlefin tambien se envia con Excel.
-        self.serlefin_attachment_exception_recipients = set(
-            settings.serlefin_attachment_exception_recipients
+        # Normalizados una sola vez (casefold) para comparar sin distinguir mayusculas.
+        self.serlefin_attachment_exception_recipients = frozenset(
+            recipient.strip().casefold()
+            for recipient in settings.serlefin_attachment_exception_recipients
         )
 
     def _recipient_requires_serlefin_attachment(self, recipient: str) -> bool:
         """Retorna True si el destinatario esta en la lista de excepcion."""
-        return recipient.strip().lower() in self.serlefin_attachment_exception_recipients
+        return recipient.strip().casefold() in self.serlefin_attachment_exception_recipients
+
+    @staticmethod
+    def _normalize_recipients(recipient: Union[str, List[str]]) -> List[str]:
+        """Lista de destinatarios sin vacios (acepta lista o texto separado por comas)."""
+        if isinstance(recipient, list):
+            return [
+                str(value).strip()
+                for value in recipient
+                if str(value).strip()
+            ]
+        return [
+            value.strip()
+            for value in str(recipient or "").split(",")
+            if value.strip()
+        ]
+
+    def open_session(self) -> smtplib.SMTP:
+        """
+        Abre una sesion SMTP autenticada (EHLO + STARTTLS + EHLO + LOGIN).
+
+        El llamador es dueno de la sesion y debe cerrarla (_close_session)
+        al terminar.
+        """
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        try:
+            server.ehlo(self.helo_name)
+            server.starttls()
+            server.ehlo(self.helo_name)
+            server.login(self.email_user, self.email_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    @staticmethod
+    def _session_alive(server: Optional[smtplib.SMTP]) -> bool:
+        """Chequeo NOOP antes de reutilizar una sesion abierta."""
+        if server is None:
+            return False
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    @staticmethod
+    def _close_session(server: Optional[smtplib.SMTP]) -> None:
+        """Cierra la sesion sin propagar errores de un servidor ya caido."""
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def _acquire(self) -> Iterator[smtplib.SMTP]:
+        """
+        Toma una sesion SMTP del pool (o abre una) para un envio.
+
+        Al salir sin error la sesion vuelve al pool si no supero el TTL ni el
+        tope de mensajes; si hubo excepcion se cierra y no se reutiliza.
+        """
+        key = (self.smtp_server, self.smtp_port, self.email_user)
+        now = time.monotonic()
+        entry: Optional[List[Any]] = None
+        stale: List[smtplib.SMTP] = []
+        with _POOL_LOCK:
+            idle = _POOL.get(key, [])
+            while idle:
+                candidate = idle.pop()
+                if now - candidate[1] < _POOL_TTL_SECONDS:
+                    entry = candidate
+                    break
+                stale.append(candidate[0])
+        for server in stale:
+            self._close_session(server)
+
+        if entry is not None and not self._session_alive(entry[0]):
+            self._close_session(entry[0])
+            entry = None
+        if entry is None:
+            entry = [self.open_session(), time.monotonic(), 0]
+
+        try:
+            yield entry[0]
+        except BaseException:
+            self._close_session(entry[0])
+            raise
+
+        entry[2] += 1
+        reusable = (
+            entry[2] < _POOL_MAX_MESSAGES
+            and time.monotonic() - entry[1] < _POOL_TTL_SECONDS
+        )
+        if reusable:
+            with _POOL_LOCK:
+                idle = _POOL.setdefault(key, [])
+                if len(idle) < _MAX_SMTP_CONNECTIONS:
+                    idle.append(entry)
+                    return
+        self._close_session(entry[0])
+
+    @staticmethod
+    def _build_attachment_part(file_path: str) -> MIMEBase:
+        """
+        Adjunto octet-stream codificado en base64 leyendo el archivo por bloques.
+
+        Cada bloque es multiplo de 57 bytes (una linea base64 de 76 caracteres),
+        asi que la salida es identica a encoders.encode_base64 sin tener el
+        archivo crudo completo en memoria.
+        """
+        buffer = io.BytesIO()
+        with open(file_path, "rb") as file_handle:
+            while True:
+                chunk = file_handle.read(_BASE64_READ_SIZE)
+                if not chunk:
+                    break
+                buffer.write(_encodebytes(chunk))
+
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(buffer.getvalue().decode("ascii"))
+        part["Content-Transfer-Encoding"] = "base64"
+        return part
+
+    def build_message(
+        self,
+        subject: str,
+        body: str,
+        attachments: Optional[List[str]] = None,
+    ) -> MIMEMultipart:
+        """
+        Arma el mensaje (From, Subject, HTML y adjuntos) sin encabezado To.
+
+        Permite codificar los adjuntos una sola vez y reutilizar el mismo
+        arbol MIME para varios destinatarios.
+        """
+        msg = MIMEMultipart()
+        msg["From"] = self.email_from
+        msg["Subject"] = subject
+
+        msg.attach(MIMEText(body, "html"))
+
+        if attachments:
+            for file_path in attachments:
+                if not Path(file_path).exists():
+                    logger.warning(f"Archivo no encontrado: {file_path}")
+                    continue
+
+                part = self._build_attachment_part(file_path)
+                filename = Path(file_path).name
+                part.add_header(
+                    "Content-Disposition",
+                    f"attachment; filename={filename}",
+                )
+                msg.attach(part)
+
+        return msg
+
+    def send_to_each(
+        self,
+        recipients: List[str],
+        subject: str,
+        body: str,
+        attachments: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Envia el mismo correo por separado a cada destinatario.
+
+        El mensaje se arma una vez (build_message) y por destinatario solo se
+        reescribe el encabezado To sobre una unica sesion SMTP.
+
+        Returns:
+            Diccionario con sent, failed y results (bool por destinatario)
+        """
+        msg = self.build_message(subject, body, attachments)
+        results: List[bool] = []
+        server: Optional[smtplib.SMTP] = None
+        try:
+            for recipient in self._normalize_recipients(recipients):
+                del msg["To"]
+                msg["To"] = recipient
+                ok = False
+                for attempt in range(2):
+                    try:
+                        if not self._session_alive(server):
+                            self._close_session(server)
+                            server = self.open_session()
+                        server.send_message(msg, to_addrs=[recipient])
+                        ok = True
+                        break
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as error:
+                        logger.warning(
+                            "Conexion SMTP perdida enviando a %s (intento %s): %s",
+                            recipient,
+                            attempt + 1,
+                            error,
+                        )
+                        self._close_session(server)
+                        server = None
+                    except Exception as error:
+                        logger.error(f"Error al enviar correo a {recipient}: {error}")
+                        break
+                results.append(ok)
+        finally:
+            self._close_session(server)
+
+        sent = sum(results)
+        logger.info("Correo individual: %s/%s destinatarios", sent, len(results))
+        return {"sent": sent, "failed": len(results) - sent, "results": results}
+
+    def send_fanout(
+        self,
+        recipients: List[str],
+        subject: str,
+        body: str,
+        attachments: Optional[List[str]] = None,
+        pool_size: int = _MAX_SMTP_CONNECTIONS,
+    ) -> Dict[str, Any]:
+        """
+        Envia el mismo correo por separado a cada destinatario en paralelo.
+
+        Cada hilo mantiene su propia sesion SMTP (threading.local) y la reutiliza
+        para todos sus envios. El mensaje se serializa una sola vez con CRLF
+        (como send_message); por destinatario solo se antepone el encabezado To.
+
+        Args:
+            recipients: Destinatarios (uno por correo)
+            pool_size: Hilos/conexiones simultaneas, como maximo _MAX_SMTP_CONNECTIONS
+
+        Returns:
+            Diccionario con sent, failed y results (bool por destinatario)
+        """
+        recipient_list = self._normalize_recipients(recipients)
+        if not recipient_list:
+            logger.warning("No hay destinatarios validos para el correo")
+            return {"sent": 0, "failed": 0, "results": []}
+
+        message = self.build_message(subject, body, attachments)
+        # sendmail envia bytes tal cual: sin CRLF los relays rechazan LF sueltos.
+        payload = message.as_bytes(policy=message.policy.clone(linesep="\r\n"))
+        local = threading.local()
+        sessions: List[smtplib.SMTP] = []
+        sessions_lock = threading.Lock()
+
+        def _send(recipient: str) -> bool:
+            for attempt in range(2):
+                server = getattr(local, "server", None)
+                try:
+                    if not self._session_alive(server):
+                        self._close_session(server)
+                        server = self.open_session()
+                        local.server = server
+                        with sessions_lock:
+                            sessions.append(server)
+                    server.sendmail(
+                        self.email_from,
+                        [recipient],
+                        b"To: " + recipient.encode("ascii") + b"\r\n" + payload,
+                    )
+                    return True
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as error:
+                    logger.warning(
+                        "Conexion SMTP perdida enviando a %s (intento %s): %s",
+                        recipient,
+                        attempt + 1,
+                        error,
+                    )
+                    self._close_session(server)
+                    local.server = None
+                except Exception as error:
+                    logger.error(f"Error al enviar correo a {recipient}: {error}")
+                    return False
+            return False
+
+        workers = max(1, min(int(pool_size), _MAX_SMTP_CONNECTIONS, len(recipient_list)))
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_send, recipient_list))
+        finally:
+            for server in sessions:
+                self._close_session(server)
+
+        sent = sum(results)
+        logger.info(
+            "Envio en abanico: %s/%s destinatarios con %s conexion(es)",
+            sent,
+            len(results),
+            workers,
+        )
+        return {"sent": sent, "failed": len(results) - sent, "results": results}
 
     def send_assignment_report(
         self,
@@ -41,6 +420,7 @@ class EmailService:
         subject: str,
         body: str,
         attachments: Optional[List[str]] = None,
+        server: Optional[smtplib.SMTP] = None,
     ) -> bool:
         """
         Envia un correo con informes de asignacion.
@@ -50,67 +430,119 @@ class EmailService:
             subject: Asunto del correo
             body: Cuerpo del mensaje (HTML)
             attachments: Lista de rutas de archivos a adjuntar
+            server: Sesion SMTP ya abierta (open_session) para reutilizarla;
+                si es None se toma una del pool de sesiones (_acquire)
 
         Returns:
             bool: True si el envio fue exitoso, False en caso contrario
         """
         try:
-            if isinstance(recipient, list):
-                recipients = [
-                    str(value).strip()
-                    for value in recipient
-                    if str(value).strip()
-                ]
-            else:
-                recipients = [
-                    value.strip()
-                    for value in str(recipient or "").split(",")
-                    if value.strip()
-                ]
+            recipients = self._normalize_recipients(recipient)
 
             if not recipients:
                 logger.warning("No hay destinatarios validos para el correo")
                 return False
 
-            msg = MIMEMultipart()
-            msg["From"] = self.email_from
+            msg = self.build_message(subject, body, attachments)
             msg["To"] = ", ".join(recipients)
-            msg["Subject"] = subject
-
-            msg.attach(MIMEText(body, "html"))
-
-            if attachments:
-                for file_path in attachments:
-                    if not Path(file_path).exists():
-                        logger.warning(f"Archivo no encontrado: {file_path}")
-                        continue
-
-                    with open(file_path, "rb") as file_handle:
-                        part = MIMEBase("application", "octet-stream")
-                        part.set_payload(file_handle.read())
 
-                    encoders.encode_base64(part)
-                    filename = Path(file_path).name
-                    part.add_header(
-                        "Content-Disposition",
-                        f"attachment; filename={filename}",
-                    )
-                    msg.attach(part)
-
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.ehlo(self.helo_name)
-                server.starttls()
-                server.ehlo(self.helo_name)
-                server.login(self.email_user, self.email_password)
+            if server is not None:
                 server.send_message(msg, to_addrs=recipients)
+            else:
+                with self._acquire() as pooled_server:
+                    pooled_server.send_message(msg, to_addrs=recipients)
 
             logger.info(f"Correo enviado exitosamente a {', '.join(recipients)}")
             return True
 
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+            # Con sesion prestada el llamador decide si reconecta (send_batch).
+            if server is not None:
+                raise
+            logger.error("Error al enviar correo: conexion SMTP perdida")
+            return False
         except Exception as error:
             logger.error(f"Error al enviar correo: {error}")
             return False
 
+    def send_batch(
+        self,
+        messages: Sequence[Tuple[Union[str, List[str]], str, str, Optional[List[str]]]],
+    ) -> Dict[str, Any]:
+        """
+        Envia varios correos reutilizando una sola sesion SMTP.
+
+        Si el servidor corta la conexion a mitad de lote, se reconecta una vez
+        y se reintenta el mismo correo. Si tras _ABORT_MIN_ATTEMPTS intentos
+        falla mas de _ABORT_FAILURE_RATIO del lote, se aborta y los correos
+        no enviados se devuelven en pending para reencolarlos.
+
+        Args:
+            messages: Tuplas (destinatario(s), asunto, cuerpo HTML, adjuntos)
+
+        Returns:
+            Diccionario con sent, failed, results (bool por correo intentado,
+            en orden), aborted y pending (mensajes sin intentar)
+        """
+        messages = list(messages)
+        results: List[bool] = []
+        failures = 0
+        aborted = False
+        server: Optional[smtplib.SMTP] = None
+        try:
+            for recipient, subject, body, attachments in messages:
+                attempted = len(results)
+                if attempted >= _ABORT_MIN_ATTEMPTS and failures / attempted > _ABORT_FAILURE_RATIO:
+                    logger.error("aborting batch: %d/%d failed", failures, attempted)
+                    aborted = True
+                    break
+                ok = False
+                for attempt in range(2):
+                    try:
+                        if not self._session_alive(server):
+                            self._close_session(server)
+                            server = self.open_session()
+                        ok = self.send_assignment_report(
+                            recipient=recipient,
+                            subject=subject,
+                            body=body,
+                            attachments=attachments,
+                            server=server,
+                        )
+                        break
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as error:
+                        logger.warning(
+                            "Conexion SMTP perdida en lote (intento %s): %s",
+                            attempt + 1,
+                            error,
+                        )
+                        self._close_session(server)
+                        server = None
+                    except Exception as error:
+                        logger.error(f"Error al abrir sesion SMTP para lote: {error}")
+                        break
+                results.append(ok)
+                if not ok:
+                    failures += 1
+        finally:
+            self._close_session(server)
+
+        sent = sum(results)
+        pending = messages[len(results):]
+        logger.info(
+            "Lote de correos: %s/%s enviados, %s pendientes",
+            sent,
+            len(results),
+            len(pending),
+        )
+        return {
+            "sent": sent,
+            "failed": failures,
+            "results": results,
+            "aborted": aborted,
+            "pending": pending,
+        }
+
     def send_multiple_reports(
         self,
         recipient: Union[str, List[str]],
@@ -119,6 +551,7 @@ class EmailService:
         metrics_html: str,
         attach_serlefin_file: bool = False,
         attach_cobyser_file: bool = True,
+        server: Optional[smtplib.SMTP] = None,
     ) -> bool:
         """
         Envia informes de ambas casas de cobranza.
@@ -130,6 +563,7 @@ class EmailService:
             metrics_html: HTML con metricas de asignacion
             attach_serlefin_file: Si True adjunta Excel de Serlefin
             attach_cobyser_file: Si True adjunta Excel de Cobyser
+            server: Sesion SMTP compartida (open_session) para envios en abanico
 
         Returns:
             bool: True si el envio fue exitoso
@@ -167,46 +601,11 @@ class EmailService:
 
         subject = "Informes de Asignacion de Cartera - Serlefin y Cobyser"
 
-        body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; }}
-                .header {{ background-color: #4CAF50; color: white; padding: 20px; text-align: center; }}
-                .content {{ padding: 20px; }}
-                .metrics {{ background-color: #f0f0f0; padding: 15px; margin: 20px 0; border-radius: 5px; }}
-                .footer {{ text-align: center; padding: 20px; color: #777; font-size: 12px; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>Informes de Asignacion de Cartera</h1>
-            </div>
-            <div class="content">
-                <p>Estimado/a,</p>
-                <p>Se comparte el resumen de asignacion de cartera para Serlefin y Cobyser.</p>
-
-                <div class="metrics">
-                    {metrics_html}
-                </div>
-
-                <p><strong>Serlefin:</strong> ya puedes validar en tu plataforma segura la informacion.</p>
-
-                <p><strong>Archivos adjuntos:</strong></p>
-                <ul>
-                    <li>Serlefin (Usuario 81): {serlefin_attachment_text}</li>
-                    <li>Cobyser (Usuario 45): {cobyser_attachment_text}</li>
-                </ul>
-
-                <p>Los informes incluyen la columna <strong>Contrato Fijo</strong>.</p>
-            </div>
-            <div class="footer">
-                <p>Este es un correo automatico generado por el Sistema de Asignacion de Cartera AloCredit.</p>
-                <p>Por favor, no responder a este correo.</p>
-            </div>
-        </body>
-        </html>
-        """
+        body = _MULTIPLE_REPORTS_BODY.substitute(
+            metrics_html=metrics_html,
+            serlefin_text=serlefin_attachment_text,
+            cobyser_text=cobyser_attachment_text,
+        )
 
         attachments: List[str] = []
         if effective_attach_serlefin and serlefin_file_exists:
@@ -219,6 +618,7 @@ class EmailService:
             subject=subject,
             body=body,
             attachments=attachments,
+            server=server,
         )
 
 
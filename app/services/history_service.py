@@ -3,18 +3,37 @@ Servicio de gestion de historial de asignaciones.
 Maneja INSERT y UPDATE en contract_advisors_history.
 """
 import logging
+from collections import defaultdict
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Set, Tuple
 
-from sqlalchemy import and_
+import numpy as np
+from sqlalchemy import Integer, and_, column, func, insert, select, tuple_, values
+from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
-from app.core.dpd import get_dpd_range
+from app.core.dpd import get_dpd_range, get_dpd_range_vec
+from app.database.bulk import (
+    COPY_INSERT_THRESHOLD,
+    copy_insert_on_conflict_returning,
+    insert_on_conflict_returning,
+)
 from app.database.models import ContractAdvisorHistory
 
 logger = logging.getLogger(__name__)
 
+# ON CONFLICT requiere el indice unico parcial ux_cah_active_pair; si la base
+# aun no lo tiene se desactiva para el resto del proceso.
+_ACTIVE_PAIR_ON_CONFLICT = True
+
+# SQLSTATE invalid_column_reference: no hay indice unico que coincida con ON CONFLICT.
+_NO_MATCHING_UNIQUE_INDEX_PGCODE = "42P10"
+
+# Pares (contrato, usuario) por consulta al filtrar historial abierto por par
+# (verificacion previa del fallback y JOIN de close_assignments).
+_PAIR_CHECK_BATCH_SIZE = 5000
+
 
 class HistoryService:
     """
@@ -27,41 +46,76 @@ class HistoryService:
 
     def __init__(self, postgres_session: Session):
         self.postgres_session = postgres_session
+        # Etiqueta de casa por usuario, construida una vez por servicio.
+        self._user_house: Dict[int, str] = settings.user_house
 
     @staticmethod
     def _to_int_or_none(value: Any) -> Optional[int]:
+        # Camino rapido: casi siempre llega int o None desde la base.
         if value is None:
             return None
+        if type(value) is int:
+            return value
+        if isinstance(value, str):
+            digits = value[1:] if value[:1] == "-" else value
+            if digits.isdecimal():
+                return int(value)
         try:
             return int(value)
         except (TypeError, ValueError):
             return None
 
-    def _resolve_initial_fields(
+    def _finish(self, commit: bool) -> None:
+        """Confirma la transaccion o solo hace flush si la controla el llamador."""
+        if commit:
+            self.postgres_session.commit()
+        else:
+            self.postgres_session.flush()
+
+    def _resolve_initial_fields_batch(
         self,
-        contract_id: int,
+        contract_ids: List[int],
         assignment_metadata: Optional[Dict[int, Dict[str, Any]]],
         default_tipo: str,
-    ) -> Dict[str, Any]:
-        metadata = (assignment_metadata or {}).get(contract_id, {})
-
-        dias_atraso_inicial = self._to_int_or_none(
-            metadata.get("dias_atraso_inicial", metadata.get("days_overdue"))
-        )
-        dpd_inicial = metadata.get("dpd_inicial") or get_dpd_range(dias_atraso_inicial)
-        dpd_actual = metadata.get("dpd_actual") or dpd_inicial
-        tipo = metadata.get("tipo") or default_tipo
-        estado_actual = str(metadata.get("estado_actual") or "SIN_ESTADO").strip()
-        if not estado_actual:
-            estado_actual = "SIN_ESTADO"
-
-        return {
-            "tipo": tipo,
-            "dpd_inicial": dpd_inicial,
-            "dpd_actual": dpd_actual,
-            "dias_atraso_inicial": dias_atraso_inicial,
-            "estado_actual": estado_actual,
-        }
+    ) -> List[Dict[str, Any]]:
+        """
+        Campos iniciales de historial para varios contratos a la vez.
+        El rango DPD por dias se calcula en un solo paso vectorizado.
+        """
+        metadata_by_contract = assignment_metadata or {}
+        metadata_rows = [metadata_by_contract.get(contract_id, {}) for contract_id in contract_ids]
+        dias_atraso = [
+            self._to_int_or_none(
+                metadata.get("dias_atraso_inicial", metadata.get("days_overdue"))
+            )
+            for metadata in metadata_rows
+        ]
+        dpd_por_dias = get_dpd_range_vec(
+            np.fromiter(
+                (0 if dias is None else dias for dias in dias_atraso),
+                dtype=np.int64,
+                count=len(dias_atraso),
+            )
+        ).tolist()
+
+        resolved: List[Dict[str, Any]] = []
+        for metadata, dias_atraso_inicial, dpd_calculado in zip(
+            metadata_rows, dias_atraso, dpd_por_dias
+        ):
+            dpd_inicial = metadata.get("dpd_inicial") or (
+                dpd_calculado if dias_atraso_inicial is not None else None
+            )
+            estado_actual = str(metadata.get("estado_actual") or "SIN_ESTADO").strip()
+            resolved.append(
+                {
+                    "tipo": metadata.get("tipo") or default_tipo,
+                    "dpd_inicial": dpd_inicial,
+                    "dpd_actual": metadata.get("dpd_actual") or dpd_inicial,
+                    "dias_atraso_inicial": dias_atraso_inicial,
+                    "estado_actual": estado_actual or "SIN_ESTADO",
+                }
+            )
+        return resolved
 
     def _resolve_terminal_fields(
         self,
@@ -91,11 +145,159 @@ class HistoryService:
             "estado_actual": estado_actual,
         }
 
+    def _build_initial_records(
+        self,
+        contract_ids: List[int],
+        user_ids: List[int],
+        assignment_metadata: Optional[Dict[int, Dict[str, Any]]],
+        default_tipo: str,
+        fecha_actual: datetime,
+    ) -> List[Dict[str, Any]]:
+        """Filas de historial abierto para los pares (contrato, usuario) dados."""
+        resolved_fields = self._resolve_initial_fields_batch(
+            contract_ids,
+            assignment_metadata,
+            default_tipo,
+        )
+        return [
+            {
+                "user_id": user_id,
+                "contract_id": contract_id,
+                "fecha_inicial": fecha_actual,
+                "fecha_terminal": None,
+                "tipo": initial_fields["tipo"],
+                "dpd_inicial": initial_fields["dpd_inicial"],
+                "dpd_terminal": None,
+                "dpd_actual": initial_fields["dpd_actual"],
+                "dias_atraso_inicial": initial_fields["dias_atraso_inicial"],
+                "dias_atraso_terminal": None,
+                "estado_actual": initial_fields["estado_actual"],
+            }
+            for contract_id, user_id, initial_fields in zip(
+                contract_ids, user_ids, resolved_fields
+            )
+        ]
+
+    def _insert_active_on_conflict(
+        self,
+        pair_array: np.ndarray,
+        assignment_metadata: Optional[Dict[int, Dict[str, Any]]],
+        default_tipo: str,
+        fecha_actual: datetime,
+    ) -> Optional[np.ndarray]:
+        """
+        INSERT ... ON CONFLICT DO NOTHING contra el indice unico parcial de
+        historial activo; Postgres descarta los pares ya abiertos sin SELECT previo.
+        Por encima de COPY_INSERT_THRESHOLD filas se cargan con COPY a una tabla
+        temporal; por debajo, INSERT multi-fila en lotes fijos.
+
+        Returns:
+            user_id de las filas insertadas, o None si la base no tiene el indice
+            (se desactiva la via y el llamador usa la verificacion previa)
+        """
+        global _ACTIVE_PAIR_ON_CONFLICT
+        records = self._build_initial_records(
+            pair_array[:, 0].tolist(),
+            pair_array[:, 1].tolist(),
+            assignment_metadata,
+            default_tipo,
+            fecha_actual,
+        )
+        logger.info(
+            "Insertando %s registros en historial (ON CONFLICT DO NOTHING)...",
+            len(records),
+        )
+        insert_rows = (
+            copy_insert_on_conflict_returning
+            if len(records) > COPY_INSERT_THRESHOLD
+            else insert_on_conflict_returning
+        )
+        try:
+            with self.postgres_session.begin_nested():
+                inserted = insert_rows(
+                    self.postgres_session,
+                    ContractAdvisorHistory,
+                    records,
+                    conflict_columns=[
+                        ContractAdvisorHistory.contract_id,
+                        ContractAdvisorHistory.user_id,
+                    ],
+                    returning=[ContractAdvisorHistory.user_id],
+                    conflict_where=ContractAdvisorHistory.fecha_terminal.is_(None),
+                )
+        except ProgrammingError as error:
+            # Solo la falta del indice habilita el fallback; otro error se propaga.
+            if getattr(error.orig, "pgcode", None) != _NO_MATCHING_UNIQUE_INDEX_PGCODE:
+                raise
+            _ACTIVE_PAIR_ON_CONFLICT = False
+            logger.warning(
+                "Sin indice unico ux_cah_active_pair para ON CONFLICT (%s). "
+                "Se usa verificacion previa de pares activos.",
+                error.orig,
+            )
+            return None
+        return np.fromiter((row[0] for row in inserted), dtype=np.int64, count=len(inserted))
+
+    def _insert_active_after_check(
+        self,
+        pair_array: np.ndarray,
+        assignment_metadata: Optional[Dict[int, Dict[str, Any]]],
+        default_tipo: str,
+        fecha_actual: datetime,
+    ) -> np.ndarray:
+        """Fallback sin indice unico: consulta los pares abiertos e inserta el resto."""
+        # Filtro por par (contrato, usuario) en SQL: solo vuelven las filas que
+        # coinciden, no todo el historial abierto de esos contratos. Lotes de
+        # _PAIR_CHECK_BATCH_SIZE pares para no exceder el limite de parametros.
+        pair_list = [tuple(pair) for pair in pair_array.tolist()]
+        existing_active: List[Tuple[int, int]] = []
+        for start in range(0, len(pair_list), _PAIR_CHECK_BATCH_SIZE):
+            existing_active.extend(
+                self.postgres_session.query(
+                    ContractAdvisorHistory.contract_id,
+                    ContractAdvisorHistory.user_id,
+                ).filter(
+                    tuple_(
+                        ContractAdvisorHistory.contract_id,
+                        ContractAdvisorHistory.user_id,
+                    ).in_(pair_list[start:start + _PAIR_CHECK_BATCH_SIZE]),
+                    ContractAdvisorHistory.fecha_terminal.is_(None),
+                ).all()
+            )
+
+        # Anti-join vectorizado: cada par (contrato, usuario) se codifica en
+        # un int64 y se descartan los que ya tienen historial abierto.
+        existing_array = np.array(existing_active, dtype=np.int64).reshape(-1, 2)
+        new_mask = np.isin(
+            (pair_array[:, 0] << 32) | pair_array[:, 1],
+            (existing_array[:, 0] << 32) | existing_array[:, 1],
+            invert=True,
+        )
+        new_user_ids = pair_array[new_mask, 1]
+
+        new_history_records = self._build_initial_records(
+            pair_array[new_mask, 0].tolist(),
+            new_user_ids.tolist(),
+            assignment_metadata,
+            default_tipo,
+            fecha_actual,
+        )
+        if new_history_records:
+            logger.info(
+                f"Insertando {len(new_history_records)} nuevos registros en historial..."
+            )
+            self.postgres_session.bulk_insert_mappings(
+                ContractAdvisorHistory,
+                new_history_records,
+            )
+        return new_user_ids
+
     def register_assignments(
         self,
         assignments: Dict[int, List[int]],
         assignment_metadata: Optional[Dict[int, Dict[str, Any]]] = None,
         default_tipo: str = "ASIGNACION",
+        commit: bool = True,
     ) -> Dict[str, int]:
         """
         Registra nuevas asignaciones en historial con fecha inicial.
@@ -104,6 +306,7 @@ class HistoryService:
             assignments: Diccionario {user_id: [contract_ids]}
             assignment_metadata: Metadatos por contrato para campos extra de historial
             default_tipo: Tipo por defecto para registros nuevos
+            commit: Si es False, solo hace flush y el commit queda a cargo del llamador
 
         Returns:
             {'total_registered': X, 'cobyser': Y, 'serlefin': Z}
@@ -123,63 +326,33 @@ class HistoryService:
                 logger.info("No hay asignaciones para registrar")
                 return stats
 
-            all_contract_ids = [pair[0] for pair in all_pairs]
-
-            existing_active = self.postgres_session.query(
-                ContractAdvisorHistory.contract_id,
-                ContractAdvisorHistory.user_id,
-            ).filter(
-                and_(
-                    ContractAdvisorHistory.contract_id.in_(all_contract_ids),
-                    ContractAdvisorHistory.fecha_terminal.is_(None),
-                )
-            ).all()
-
-            existing_pairs = set((int(row[0]), int(row[1])) for row in existing_active)
-
-            new_history_records = []
-            for contract_id, user_id in all_pairs:
-                if (contract_id, user_id) in existing_pairs:
-                    continue
+            pair_array = np.array(all_pairs, dtype=np.int64)
 
-                initial_fields = self._resolve_initial_fields(
-                    contract_id,
+            new_user_ids = None
+            if _ACTIVE_PAIR_ON_CONFLICT:
+                new_user_ids = self._insert_active_on_conflict(
+                    pair_array,
                     assignment_metadata,
                     default_tipo,
+                    fecha_actual,
                 )
-
-                new_history_records.append(
-                    {
-                        "user_id": user_id,
-                        "contract_id": contract_id,
-                        "fecha_inicial": fecha_actual,
-                        "fecha_terminal": None,
-                        "tipo": initial_fields["tipo"],
-                        "dpd_inicial": initial_fields["dpd_inicial"],
-                        "dpd_terminal": None,
-                        "dpd_actual": initial_fields["dpd_actual"],
-                        "dias_atraso_inicial": initial_fields["dias_atraso_inicial"],
-                        "dias_atraso_terminal": None,
-                        "estado_actual": initial_fields["estado_actual"],
-                    }
+            if new_user_ids is None:
+                new_user_ids = self._insert_active_after_check(
+                    pair_array,
+                    assignment_metadata,
+                    default_tipo,
+                    fecha_actual,
                 )
 
-                stats["total_registered"] += 1
-                if user_id in settings.COBYSER_USERS:
-                    stats["cobyser"] += 1
-                elif user_id in settings.SERLEFIN_USERS:
-                    stats["serlefin"] += 1
-
-            if new_history_records:
-                logger.info(
-                    f"Insertando {len(new_history_records)} nuevos registros en historial..."
-                )
-                self.postgres_session.bulk_insert_mappings(
-                    ContractAdvisorHistory,
-                    new_history_records,
-                )
+            # Conteo por casa: un conteo por usuario y la casa sale de user_house.
+            stats["total_registered"] = int(new_user_ids.size)
+            user_ids, counts = np.unique(new_user_ids, return_counts=True)
+            for user_id, count in zip(user_ids.tolist(), counts.tolist()):
+                house = self._user_house.get(user_id)
+                if house:
+                    stats[house] += count
 
-            self.postgres_session.commit()
+            self._finish(commit)
 
             logger.info(
                 "Historial registrado: "
@@ -192,13 +365,17 @@ class HistoryService:
 
         except Exception as e:
             logger.error(f"Error al registrar historial: {e}")
-            self.postgres_session.rollback()
+            # Con commit=False la transaccion es del llamador (p. ej. dentro de
+            # un SAVEPOINT): un rollback aqui deshace tambien su trabajo previo.
+            if commit:
+                self.postgres_session.rollback()
             raise
 
     def close_assignments(
         self,
         contracts_removed: Dict[int, List[int]],
         terminal_metadata: Optional[Dict[int, Dict[str, Any]]] = None,
+        commit: bool = True,
     ) -> Dict[str, int]:
         """
         Cierra asignaciones activas en historial actualizando fecha terminal.
@@ -206,6 +383,7 @@ class HistoryService:
         Args:
             contracts_removed: {user_id: [contract_ids]} eliminados de contract_advisors
             terminal_metadata: metadatos por contrato para tipo y DPD terminal
+            commit: Si es False, solo hace flush y el commit queda a cargo del llamador
 
         Returns:
             {'total_closed': X, 'updated': Y, 'inserted': Z, 'cobyser': A, 'serlefin': B}
@@ -231,22 +409,42 @@ class HistoryService:
             return stats
 
         try:
-            contract_ids = [pair[0] for pair in all_pairs]
-            user_ids = list({pair[1] for pair in all_pairs})
-
-            active_records = self.postgres_session.query(ContractAdvisorHistory).filter(
-                and_(
-                    ContractAdvisorHistory.contract_id.in_(contract_ids),
-                    ContractAdvisorHistory.user_id.in_(user_ids),
+            # JOIN contra VALUES con los pares exactos (contrato, usuario): evita el
+            # producto contract_id IN (...) AND user_id IN (...) y permite hash join.
+            # Por lotes de _PAIR_CHECK_BATCH_SIZE pares para acotar los parametros
+            # por sentencia (cerrar todo el historial puede sumar cientos de miles).
+            unique_pairs = sorted(set(all_pairs))
+            active_map: Dict[Tuple[int, int], Any] = {}
+            for start in range(0, len(unique_pairs), _PAIR_CHECK_BATCH_SIZE):
+                pairs = values(
+                    column("contract_id", Integer),
+                    column("user_id", Integer),
+                    name="pairs",
+                ).data(unique_pairs[start:start + _PAIR_CHECK_BATCH_SIZE])
+
+                # Solo las columnas necesarias para decidir el UPDATE (sin objetos ORM).
+                active_records = self.postgres_session.query(
+                    ContractAdvisorHistory.id,
+                    ContractAdvisorHistory.contract_id,
+                    ContractAdvisorHistory.user_id,
+                    ContractAdvisorHistory.dpd_inicial,
+                    ContractAdvisorHistory.dias_atraso_inicial,
+                ).join(
+                    pairs,
+                    and_(
+                        ContractAdvisorHistory.contract_id == pairs.c.contract_id,
+                        ContractAdvisorHistory.user_id == pairs.c.user_id,
+                    ),
+                ).filter(
                     ContractAdvisorHistory.fecha_terminal.is_(None),
-                )
-            ).all()
+                ).all()
 
-            active_map: Dict[Tuple[int, int], ContractAdvisorHistory] = {
-                (int(record.contract_id), int(record.user_id)): record
-                for record in active_records
-            }
+                for record in active_records:
+                    active_map[(int(record.contract_id), int(record.user_id))] = record
 
+            user_house = self._user_house
+            closed_history_records: List[Dict[str, Any]] = []
+            history_updates: List[Dict[str, Any]] = []
             for contract_id, user_id in all_pairs:
                 terminal_fields = self._resolve_terminal_fields(
                     contract_id,
@@ -256,24 +454,25 @@ class HistoryService:
                 record = active_map.get((contract_id, user_id))
 
                 if record:
-                    record.fecha_terminal = fecha_actual
-                    record.tipo = terminal_fields["tipo"]
-                    record.dpd_terminal = terminal_fields["dpd_terminal"]
-                    record.dias_atraso_terminal = terminal_fields[
-                        "dias_atraso_terminal"
-                    ]
-                    record.dpd_actual = terminal_fields["dpd_actual"]
-                    record.estado_actual = terminal_fields["estado_actual"]
-
+                    update_values = {
+                        "id": record.id,
+                        "fecha_terminal": fecha_actual,
+                        "tipo": terminal_fields["tipo"],
+                        "dpd_terminal": terminal_fields["dpd_terminal"],
+                        "dias_atraso_terminal": terminal_fields["dias_atraso_terminal"],
+                        "dpd_actual": terminal_fields["dpd_actual"],
+                        "estado_actual": terminal_fields["estado_actual"],
+                    }
                     if record.dpd_inicial is None and terminal_fields["dpd_inicial"]:
-                        record.dpd_inicial = terminal_fields["dpd_inicial"]
+                        update_values["dpd_inicial"] = terminal_fields["dpd_inicial"]
                     if (
                         record.dias_atraso_inicial is None
                         and terminal_fields["dias_atraso_inicial"] is not None
                     ):
-                        record.dias_atraso_inicial = terminal_fields[
+                        update_values["dias_atraso_inicial"] = terminal_fields[
                             "dias_atraso_inicial"
                         ]
+                    history_updates.append(update_values)
 
                     stats["updated"] += 1
                 else:
@@ -286,29 +485,43 @@ class HistoryService:
                     if dpd_inicial is None:
                         dpd_inicial = get_dpd_range(dias_inicial)
 
-                    new_history = ContractAdvisorHistory(
-                        user_id=user_id,
-                        contract_id=contract_id,
-                        fecha_inicial=fecha_actual,
-                        fecha_terminal=fecha_actual,
-                        tipo=terminal_fields["tipo"],
-                        dpd_inicial=dpd_inicial,
-                        dpd_terminal=terminal_fields["dpd_terminal"],
-                        dpd_actual=terminal_fields["dpd_actual"],
-                        dias_atraso_inicial=dias_inicial,
-                        dias_atraso_terminal=terminal_fields["dias_atraso_terminal"],
-                        estado_actual=terminal_fields["estado_actual"],
+                    closed_history_records.append(
+                        {
+                            "user_id": user_id,
+                            "contract_id": contract_id,
+                            "fecha_inicial": fecha_actual,
+                            "fecha_terminal": fecha_actual,
+                            "tipo": terminal_fields["tipo"],
+                            "dpd_inicial": dpd_inicial,
+                            "dpd_terminal": terminal_fields["dpd_terminal"],
+                            "dpd_actual": terminal_fields["dpd_actual"],
+                            "dias_atraso_inicial": dias_inicial,
+                            "dias_atraso_terminal": terminal_fields["dias_atraso_terminal"],
+                            "estado_actual": terminal_fields["estado_actual"],
+                        }
                     )
-                    self.postgres_session.add(new_history)
                     stats["inserted"] += 1
 
                 stats["total_closed"] += 1
-                if user_id in settings.COBYSER_USERS:
-                    stats["cobyser"] += 1
-                elif user_id in settings.SERLEFIN_USERS:
-                    stats["serlefin"] += 1
+                house = user_house.get(user_id)
+                if house:
+                    stats[house] += 1
+
+            # UPDATE por lotes (executemany agrupado por columnas) en lugar de
+            # un UPDATE por objeto sucio en el flush.
+            if history_updates:
+                self.postgres_session.bulk_update_mappings(
+                    ContractAdvisorHistory,
+                    history_updates,
+                )
+            if closed_history_records:
+                # executemany de INSERT: el engine lo agrupa en VALUES multi-fila.
+                self.postgres_session.execute(
+                    insert(ContractAdvisorHistory),
+                    closed_history_records,
+                )
 
-            self.postgres_session.commit()
+            self._finish(commit)
 
             logger.info(
                 "Asignaciones cerradas en historial: "
@@ -319,7 +532,9 @@ class HistoryService:
 
         except Exception as e:
             logger.error(f"Error al cerrar asignaciones en historial: {e}")
-            self.postgres_session.rollback()
+            # Igual que en register_assignments: sin commit no se toca la transaccion.
+            if commit:
+                self.postgres_session.rollback()
             raise
 
     def get_active_assignments(self, user_ids: List[int] = None) -> Dict[int, Set[int]]:
@@ -327,20 +542,26 @@ class HistoryService:
         logger.info("Consultando asignaciones activas del historial...")
 
         try:
-            query = self.postgres_session.query(ContractAdvisorHistory).filter(
+            # Tuplas (user_id, contract_id): el indice parcial ux_cah_active_pair
+            # cubre el filtro y no se instancian objetos ORM. Cursor de servidor
+            # en bloques de 10k para no cargar todo el resultado en memoria.
+            stmt = select(
+                ContractAdvisorHistory.user_id,
+                ContractAdvisorHistory.contract_id,
+            ).where(
                 ContractAdvisorHistory.fecha_terminal.is_(None)
             )
 
             if user_ids:
-                query = query.filter(ContractAdvisorHistory.user_id.in_(user_ids))
-
-            records = query.all()
+                stmt = stmt.where(ContractAdvisorHistory.user_id.in_(user_ids))
 
-            active_assignments: Dict[int, Set[int]] = {}
-            for record in records:
-                if record.user_id not in active_assignments:
-                    active_assignments[record.user_id] = set()
-                active_assignments[record.user_id].add(record.contract_id)
+            rows = self.postgres_session.execute(
+                stmt.execution_options(yield_per=10_000)
+            )
+            active_assignments: Dict[int, Set[int]] = defaultdict(set)
+            for user_id, contract_id in rows:
+                active_assignments[user_id].add(contract_id)
+            active_assignments = dict(active_assignments)
 
             total_active = sum(
                 len(contracts) for contracts in active_assignments.values()
@@ -356,20 +577,23 @@ class HistoryService:
     def get_history_stats(self) -> Dict:
         """Obtiene estadisticas generales del historial."""
         try:
-            total_records = self.postgres_session.query(ContractAdvisorHistory).count()
-
-            active_records = self.postgres_session.query(ContractAdvisorHistory).filter(
-                ContractAdvisorHistory.fecha_terminal.is_(None)
-            ).count()
-
-            closed_records = self.postgres_session.query(ContractAdvisorHistory).filter(
-                ContractAdvisorHistory.fecha_terminal.isnot(None)
-            ).count()
+            # Los tres conteos en un solo recorrido con FILTER.
+            row = self.postgres_session.execute(
+                select(
+                    func.count().label("total"),
+                    func.count().filter(
+                        ContractAdvisorHistory.fecha_terminal.is_(None)
+                    ).label("active"),
+                    func.count().filter(
+                        ContractAdvisorHistory.fecha_terminal.isnot(None)
+                    ).label("closed"),
+                ).select_from(ContractAdvisorHistory)
+            ).one()
 
             stats = {
-                "total_records": total_records,
-                "active_assignments": active_records,
-                "closed_assignments": closed_records,
+                "total_records": int(row.total),
+                "active_assignments": int(row.active),
+                "closed_assignments": int(row.closed),
             }
 
             logger.info(f"Estadisticas del historial: {stats}")
@@ -5,8 +5,10 @@ Procesa contratos para Cobyser (Usuario 45) y Serlefin (Usuario 81).
 """
 import logging
 from typing import List, Dict, Set, Optional
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.database.bulk import copy_insert
 from app.database.models import ContractAdvisor, Management
 from app.services.contract_service import ContractService
 from app.services.history_service import HistoryService
@@ -109,6 +111,17 @@ class ManualFixedService:
             # Paso 2: VALIDACIÓN POR USUARIO - Verificar contratos ya asignados específicamente
             logger.info("Validando contratos ya asignados por usuario en contract_advisors...")
             contracts_to_insert_by_user = {}
+
+            # Una sola consulta de pares (user_id, contract_id) ya asignados para
+            # todos los usuarios, en vez de una consulta por usuario.
+            existing_pairs = set(
+                self.postgres_session.execute(
+                    select(ContractAdvisor.user_id, ContractAdvisor.contract_id).where(
+                        ContractAdvisor.contract_id.in_(all_manual_contract_ids),
+                        ContractAdvisor.user_id.in_(list(manual_contracts.keys())),
+                    )
+                ).all()
+            )
             
             for user_id, contract_ids in manual_contracts.items():
                 user_contract_ids = {int(contract_id) for contract_id in contract_ids}
@@ -117,15 +130,12 @@ class ManualFixedService:
                 stats['by_user'][user_id]['blocked'] = len(blocked_for_user)
                 stats['blocked_by_client_blacklist'] += len(blocked_for_user)
 
-                # Verificar cuáles contratos YA están asignados a ESTE usuario específico
-                existing_for_user = self.postgres_session.query(
-                    ContractAdvisor.contract_id
-                ).filter(
-                    ContractAdvisor.contract_id.in_(candidate_contract_ids),
-                    ContractAdvisor.user_id == user_id
-                ).all()
-                
-                existing_contract_ids_for_user = set(row[0] for row in existing_for_user)
+                # Contratos que YA están asignados a ESTE usuario específico
+                existing_contract_ids_for_user = {
+                    contract_id
+                    for contract_id in candidate_contract_ids
+                    if (user_id, contract_id) in existing_pairs
+                }
                 
                 # Contratos nuevos = contratos proporcionados - contratos ya asignados a este usuario
                 new_contracts_for_user = candidate_contract_ids - existing_contract_ids_for_user
@@ -162,11 +172,10 @@ class ManualFixedService:
                 logger.info("✓ No hay contratos nuevos para insertar (todos ya existen)")
                 return stats
             
-            # Paso 5: INSERCIÓN POR LOTES Y POR USUARIO
-            logger.info("Insertando contratos fijos manuales por lotes...")
+            # Paso 5: INSERCIÓN DE TODOS LOS USUARIOS CON UN SOLO COPY
+            logger.info("Insertando contratos fijos manuales con COPY...")
             new_assignments = {}
-            batch_size = 1000  # Tamaño de lote para commits
-            inserted_count = 0
+            rows_to_insert = []
             
             for user_id, contracts_to_insert_for_user in contracts_to_insert_by_user.items():
                 if not contracts_to_insert_for_user:
@@ -174,23 +183,13 @@ class ManualFixedService:
                     stats['by_user'][user_id]['skipped'] = len(manual_contracts[user_id])
                     continue
                     
-                new_assignments[user_id] = []
+                new_assignments[user_id] = list(contracts_to_insert_for_user)
+                stats['by_user'][user_id]['inserted'] = len(new_assignments[user_id])
                 logger.info(f"  Insertando {len(contracts_to_insert_for_user)} contratos para usuario {user_id}...")
-                
-                for contract_id in contracts_to_insert_for_user:
-                    new_assignment = ContractAdvisor(
-                        contract_id=contract_id,
-                        user_id=user_id
-                    )
-                    self.postgres_session.add(new_assignment)
-                    new_assignments[user_id].append(contract_id)
-                    inserted_count += 1
-                    stats['by_user'][user_id]['inserted'] += 1
-                    
-                    # Commit por lotes
-                    if inserted_count % batch_size == 0:
-                        self.postgres_session.commit()
-                        logger.info(f"    ✓ Commitido lote de {batch_size} contratos")
+                rows_to_insert.extend(
+                    {'contract_id': contract_id, 'user_id': user_id}
+                    for contract_id in new_assignments[user_id]
+                )
                 
                 # Contratos omitidos = total - insertados
                 already_assigned_count = (
@@ -200,7 +199,7 @@ class ManualFixedService:
                 )
                 stats['by_user'][user_id]['skipped'] = max(0, already_assigned_count)
             
-            # Commit final
+            inserted_count = copy_insert(self.postgres_session, ContractAdvisor, rows_to_insert)
             self.postgres_session.commit()
             stats['inserted'] = inserted_count
             logger.info(f"✓ Total insertado: {stats['inserted']} contratos")
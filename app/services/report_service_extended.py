@@ -64,7 +64,7 @@ class ReportServiceExtended:
         """Obtiene TODOS los contratos asignados a cualquier usuario de la casa."""
         if not user_ids:
             return []
-        users_str = ",".join(str(int(uid)) for uid in user_ids)
+        users_str = ",".join(map(str, map(int, user_ids)))
         query = f"SELECT DISTINCT contract_id FROM contract_advisors WHERE user_id IN ({users_str});"
 
         try:
@@ -377,7 +377,7 @@ ORDER BY c.id ASC;
             logger.warning(f"No hay contratos para user {user_id}")
             return None, None
         
-        lista_contratos = ",".join(str(x) for x in contracts)
+        lista_contratos = ",".join(map(str, contracts))
         
         try:
             logger.info(f"ðŸ“Š Generando reporte para {user_name} ({len(contracts)} contratos)...")
@@ -472,7 +472,14 @@ ORDER BY c.id ASC;
             file_path = self.reports_dir / file_name
             
             # Guardar Excel
-            df.to_excel(file_path, index=False)
+            # xlsxwriter serializa sin construir el arbol de objetos de openpyxl.
+            # constant_memory no se usa: pandas escribe por columnas y perderia celdas.
+            with pd.ExcelWriter(
+                file_path,
+                engine="xlsxwriter",
+                engine_kwargs={"options": {"strings_to_urls": False}},
+            ) as writer:
+                df.to_excel(writer, index=False)
             logger.info(f"âœ… INFORME GENERADO: {file_path}")
             
             return str(file_path), df
@@ -513,7 +520,7 @@ ORDER BY c.id ASC;
             with db_manager.get_mysql_session() as mysql_session:
                 for i in range(0, len(missing_ids), batch_size):
                     batch = missing_ids[i : i + batch_size]
-                    batch_str = ",".join(str(int(cid)) for cid in batch)
+                    batch_str = ",".join(map(str, map(int, batch)))
 
                     query = text(f"""
                         SELECT
@@ -16,6 +16,7 @@ from app.api.routes.collection_agency import router as collection_agency_router
 from app.core.config import settings
 from app.database.connections import db_manager
 from app.runtime_config.service import RuntimeConfigService
+from app.services.collection_agency_report_service import close_report_pools
 from app.services.scheduler_service import auto_assignment_scheduler
 
 # Configuracion de logging
@@ -85,6 +86,7 @@ async def lifespan(app: FastAPI):
         await auto_assignment_scheduler.stop()
         logger.info("Cerrando conexiones de bases de datos...")
         db_manager.close_all()
+        close_report_pools()
         logger.info("Aplicacion cerrada correctamente")
 
 
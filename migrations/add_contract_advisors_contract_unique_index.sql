@@ -0,0 +1,40 @@
+-- Indice unico por contrato en asignaciones activas
+-- Tabla objetivo: alocreditindicators.contract_advisors
+-- Los INSERT ... ON CONFLICT (contract_id) DO NOTHING de division y asignacion
+-- requieren un indice unico sobre contract_id; tambien cubre las busquedas
+-- contract_id IN (...) y los DELETE ... RETURNING por contrato.
+-- Si la tabla ya tiene el constraint UNIQUE (ver check_contract_advisors_schema.py)
+-- este script no cambia nada.
+
+BEGIN;
+
+-- Limpiar duplicados previos: se conserva la asignacion mas antigua (menor id)
+-- y se cierra el historial abierto de cada asignacion eliminada, salvo que la
+-- asignacion conservada sea del mismo usuario (ese historial sigue vigente).
+-- El UPDATE ve la tabla previa al DELETE, por eso se excluyen los id borrados.
+WITH removed AS (
+    DELETE FROM alocreditindicators.contract_advisors ca
+    USING alocreditindicators.contract_advisors dup
+    WHERE ca.contract_id = dup.contract_id
+      AND ca.id > dup.id
+    RETURNING ca.id, ca.contract_id, ca.user_id
+)
+UPDATE alocreditindicators.contract_advisors_history cah
+SET "Fecha Terminal" = NOW(),
+    tipo = 'DUPLICADO_DEPURADO'
+FROM (SELECT DISTINCT contract_id, user_id FROM removed) r
+WHERE cah.contract_id = r.contract_id
+  AND cah.user_id = r.user_id
+  AND cah."Fecha Terminal" IS NULL
+  AND NOT EXISTS (
+      SELECT 1
+      FROM alocreditindicators.contract_advisors keep
+      WHERE keep.contract_id = r.contract_id
+        AND keep.user_id = r.user_id
+        AND keep.id NOT IN (SELECT id FROM removed)
+  );
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_contract_advisors_contract_id
+    ON alocreditindicators.contract_advisors (contract_id);
+
+COMMIT;
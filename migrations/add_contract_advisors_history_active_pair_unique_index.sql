@@ -0,0 +1,26 @@
+-- Indice unico parcial para historial activo
+-- Tabla objetivo: alocreditindicators.contract_advisors_history
+-- register_assignments inserta con ON CONFLICT (contract_id, user_id)
+-- WHERE "Fecha Terminal" IS NULL DO NOTHING; sin este indice el servicio vuelve
+-- a la verificacion previa con SELECT. Tambien cubre las busquedas de
+-- historial activo por (contract_id, user_id).
+
+BEGIN;
+
+-- Cerrar historiales abiertos duplicados: se conserva el mas antiguo (menor id)
+-- y los cerrados quedan marcados con tipo DUPLICADO_DEPURADO.
+UPDATE alocreditindicators.contract_advisors_history cah
+SET "Fecha Terminal" = NOW(),
+    tipo = 'DUPLICADO_DEPURADO'
+FROM alocreditindicators.contract_advisors_history dup
+WHERE cah.contract_id = dup.contract_id
+  AND cah.user_id = dup.user_id
+  AND cah."Fecha Terminal" IS NULL
+  AND dup."Fecha Terminal" IS NULL
+  AND cah.id > dup.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_cah_active_pair
+    ON alocreditindicators.contract_advisors_history (contract_id, user_id)
+    WHERE "Fecha Terminal" IS NULL;
+
+COMMIT;
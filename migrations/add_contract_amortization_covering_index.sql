@@ -0,0 +1,23 @@
+-- Indice cubriente para el informe de casa de cobranza
+-- Tabla objetivo: alocreditprod.contract_amortization
+-- Los CTE del informe filtran por contract_id y estado de cuota y solo leen
+-- estas columnas: con INCLUDE la lectura puede resolverse con index-only scan.
+-- CONCURRENTLY no bloquea escrituras; no ejecutar dentro de una transaccion.
+-- Si una ejecucion se interrumpe el indice queda INVALID (pg_index.indisvalid)
+-- y IF NOT EXISTS no lo repara: borrarlo con
+-- DROP INDEX CONCURRENTLY alocreditprod.ix_ca_contract_status y volver a correr.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ca_contract_status
+    ON alocreditprod.contract_amortization (contract_id, contract_amortization_payment_status_id)
+    INCLUDE (
+        outstanding_principal,
+        period_number,
+        expiration_date,
+        interest_payment,
+        endorsement,
+        vat,
+        seguro_vida,
+        seguro,
+        digital_sign,
+        digital_sign_iva
+    );
@@ -0,0 +1,10 @@
+-- Indices para los filtros de contratos fijos (division y asignacion)
+-- Tabla objetivo: alocreditindicators.managements
+-- acuerdo_de_pago filtra por promise_date y pago_total por management_date,
+-- siempre acotados por user_id y effect.
+
+CREATE INDEX IF NOT EXISTS idx_managements_user_effect_promise_date
+    ON alocreditindicators.managements (user_id, effect, promise_date);
+
+CREATE INDEX IF NOT EXISTS idx_managements_user_effect_management_date
+    ON alocreditindicators.managements (user_id, effect, management_date);
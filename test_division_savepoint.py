@@ -0,0 +1,107 @@
+"""
+Test del SAVEPOINT de guardado en DivisionService.execute_division_process.
+Verifica que si falla el guardado, la depuración previa (lista negra) queda
+confirmada. Usa SQLite en memoria, sin servidor activo.
+"""
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import Session
+
+# Agregar directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.config import settings
+from app.database.models import ContractAdvisor, ContractAdvisorHistory
+from app.services import division_service as division_module
+from app.services.division_service import DivisionService
+
+
+def _sqlite_engine():
+    """SQLite con el esquema alocreditindicators y SAVEPOINT funcional."""
+    engine = create_engine("sqlite://")
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("ATTACH DATABASE ':memory:' AS alocreditindicators")
+
+    @event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    ContractAdvisor.__table__.create(engine)
+    ContractAdvisorHistory.__table__.create(engine)
+    return engine
+
+
+def _insert_rows(session, model, rows, conflict_columns, returning, **_kwargs):
+    """Reemplazo de insert_on_conflict_returning (ON CONFLICT es solo PostgreSQL)."""
+    session.execute(insert(model), rows)
+    return [(row["contract_id"], row["user_id"]) for row in rows]
+
+
+def test_purge_survives_failed_save():
+    """Un error dentro de save_assignments no deshace la depuración previa."""
+    print("=" * 80)
+    print("TEST DE SAVEPOINT EN DIVISIÓN")
+    print("=" * 80)
+
+    engine = _sqlite_engine()
+    user_id = settings.DIVISION_USER_IDS[0]
+    blocked_contract_id = 1001
+    new_contract_id = 2002
+
+    with Session(engine) as session:
+        session.add(ContractAdvisor(contract_id=blocked_contract_id, user_id=user_id))
+        session.commit()
+
+    session = Session(engine)
+    service = DivisionService(mysql_session=None, postgres_session=session)
+
+    # Entradas del proceso sin MySQL: un contrato bloqueado y uno nuevo a asignar.
+    service._load_customer_document_blacklist = lambda: {"123"}
+    service._resolve_blocked_contract_ids = lambda: {blocked_contract_id}
+    service.get_fixed_contracts = lambda: {
+        uid: set() for uid in settings.DIVISION_USER_IDS
+    }
+    service.get_contracts_for_division = lambda excluded_contract_ids=None: []
+    service.balance_assignments = lambda *args: ({user_id: [new_contract_id]}, {})
+    # El JOIN contra VALUES de close_assignments es solo PostgreSQL.
+    service.history_service.close_assignments = (
+        lambda contracts_removed, terminal_metadata=None, commit=True: {
+            "total_closed": sum(len(ids) for ids in contracts_removed.values())
+        }
+    )
+
+    def _failing_insert(*args, **kwargs):
+        raise RuntimeError("falla forzada al registrar historial")
+
+    service.history_service._insert_active_on_conflict = _failing_insert
+
+    original_insert = division_module.insert_on_conflict_returning
+    division_module.insert_on_conflict_returning = _insert_rows
+    try:
+        service.execute_division_process()
+        raise AssertionError("Se esperaba el error forzado en save_assignments")
+    except RuntimeError as error:
+        print(f"  Error esperado: {error}")
+    finally:
+        division_module.insert_on_conflict_returning = original_insert
+        session.close()
+
+    with Session(engine) as check_session:
+        remaining = set(
+            check_session.execute(select(ContractAdvisor.contract_id)).scalars()
+        )
+
+    print(f"  Contratos en contract_advisors: {sorted(remaining)}")
+    assert blocked_contract_id not in remaining, "La depuración previa se perdió"
+    assert new_contract_id not in remaining, "El guardado fallido no se deshizo"
+
+    print("✅ La depuración previa se conserva y el guardado se deshace")
+
+
+if __name__ == "__main__":
+    test_purge_survives_failed_save()